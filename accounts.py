@@ -0,0 +1,75 @@
+import os
+import re
+import json
+from collections import namedtuple
+from session_store import STORAGE_STATE_FILE, SESSION_INDEX_FILE, account_session_files
+
+# 一个DeepNote账号：name为空表示GT_PW配置的默认账号，沿用原有的会话文件和浏览器用户数据目录；
+# 其他账号的会话快照和用户数据目录以name区分
+Account = namedtuple("Account", ["name", "username", "password", "urls", "state_file", "index_file"])
+
+def split_urls(raw):
+    """拆分保活链接，多个链接可用逗号、空格或换行分隔"""
+    return [url for url in re.split(r'[\s,]+', raw or '') if url]
+
+def account_name(username):
+    return re.sub(r"[^A-Za-z0-9._-]", "_", username) or "default"
+
+def default_account(username, password, urls):
+    return Account("", username, password, list(urls), STORAGE_STATE_FILE, SESSION_INDEX_FILE)
+
+def make_account(username, password, urls):
+    name = account_name(username)
+    state_file, index_file = account_session_files(name)
+    return Account(name, username, password, list(urls), state_file, index_file)
+
+# 多账号配置：ACCOUNTS_FILE_ENV指向JSON文件，格式为
+# [{"username": "...", "password": "...", "urls": ["https://deepnote.com/...", ...]}, ...]
+# 或者ACCOUNTS_ENV中每行一个账号："用户名 密码 链接1 链接2 ..."（此时密码不能包含空格）
+ACCOUNTS_FILE_ENV = "KEEPALIVE_ACCOUNTS_FILE"
+ACCOUNTS_ENV = "KEEPALIVE_ACCOUNTS"
+
+def parse_accounts_file(path):
+    with open(path, "r") as f:
+        entries = json.load(f)
+    accounts = []
+    for entry in entries:
+        urls = entry.get("urls", [])
+        if isinstance(urls, str):
+            urls = split_urls(urls)
+        accounts.append(make_account(entry["username"], entry["password"], urls))
+    return accounts
+
+def parse_accounts_env(raw):
+    accounts = []
+    for line in raw.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        if len(fields) < 2:
+            print(f"错误: {ACCOUNTS_ENV}中的账号'{fields[0]}'缺少密码，已忽略")
+            continue
+        accounts.append(make_account(fields[0], fields[1], split_urls(" ".join(fields[2:]))))
+    return accounts
+
+def load_accounts():
+    """读取多账号配置，没有配置时返回空列表（此时沿用GT_PW和DEEP_URL）"""
+    path = os.environ.get(ACCOUNTS_FILE_ENV, "")
+    try:
+        if path:
+            accounts = parse_accounts_file(path)
+        else:
+            accounts = parse_accounts_env(os.environ.get(ACCOUNTS_ENV, ""))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"读取多账号配置时出错: {str(e)}")
+        return []
+
+    # 同一个账号只保留一份，链接合并
+    merged = {}
+    for account in accounts:
+        if account.name in merged:
+            previous = merged[account.name]
+            merged[account.name] = previous._replace(urls=previous.urls + [url for url in account.urls if url not in previous.urls])
+        else:
+            merged[account.name] = account
+    return list(merged.values())
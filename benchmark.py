@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import subprocess
+import tempfile
+from pathlib import Path
+from mock_server import MockServer, MockState, SESSION_COOKIE, SESSION_MAX_AGE
+from session_store import STORAGE_STATE_FILE, SESSION_INDEX_FILE, build_index
+from browser_engine import ENGINES
+from process_stats import child_pids, process_rss
+from telemetry import percentile
+
+# 端到端基准测试：在本地模拟服务器上按场景运行main.py，报告总耗时和各阶段耗时
+MAIN_SCRIPT = Path(__file__).resolve().parent / "main.py"
+# 每个场景运行次数
+REPEAT_ENV = "BENCH_REPEAT"
+# 报告中列出的阶段（telemetry记录的阶段名）
+REPORT_PHASES = [
+    "http_probe", "browser_launch", "login", "login.cookie", "login.password", "login.verify",
+    "navigate", "status_check", "run_click", "post_click_wait",
+]
+
+# 场景：会话快照（valid/expired/stale/None）、服务器状态和额外的环境变量
+SCENARIOS = {
+    # 会话有效且机器已在运行，浏览器只需确认状态
+    "valid_cookies": {"session": "valid", "state": {"running": True}},
+    # 会话有效、机器已停止，需要点击Run
+    "valid_cookies_stopped": {"session": "valid", "state": {"running": False}},
+    # cookie已过期，需要完整的GitHub密码登录
+    "expired_cookies": {"session": "expired", "state": {"running": False}},
+    # cookie未过期但服务端已失效，先尝试cookie再回退到密码登录
+    "stale_cookies": {"session": "stale", "state": {"running": False}},
+    # 没有保存的会话（首次运行）
+    "first_run": {"session": None, "state": {"running": False}},
+    # Run按钮只能被第3种方法定位到
+    "run_button_fallback3": {"session": "valid", "state": {"running": False, "run_button": 3}},
+    # 机器启动缓慢，点击Run后20秒才进入Running
+    "slow_start": {"session": "valid", "state": {"running": False, "run_delay": 20}},
+    # 配置了状态接口时HTTP探测直接判定运行中，不启动浏览器
+    "http_probe_shortcut": {
+        "session": "valid",
+        "state": {"running": True},
+        "env": {"DEEP_STATUS_API": "{base}/api/projects/{project_id}/machine"},
+    },
+}
+
+def write_session_state(workdir, server, session):
+    """在工作目录中写入场景对应的会话快照"""
+    if session is None:
+        return
+    if session == "valid":
+        token = server.state.new_session()
+        expires = time.time() + SESSION_MAX_AGE
+    elif session == "expired":
+        token = server.state.new_session()
+        expires = time.time() - 3600
+    else:
+        # 未过期但服务端不认识的会话
+        token = "stale-session"
+        expires = time.time() + SESSION_MAX_AGE
+    state = {
+        "cookies": [{
+            "name": SESSION_COOKIE, "value": token, "domain": "127.0.0.1", "path": "/",
+            "expires": expires, "httpOnly": True, "secure": False, "sameSite": "Lax",
+        }],
+        "origins": [],
+    }
+    with open(workdir / STORAGE_STATE_FILE, "w") as f:
+        json.dump(state, f)
+    with open(workdir / SESSION_INDEX_FILE, "w") as f:
+        json.dump(build_index(state, auth_domain="127.0.0.1"), f)
+
+def read_spans(trace_file):
+    spans = []
+    if not trace_file.exists():
+        return spans
+    with open(trace_file, "r") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+    return spans
+
+def phase_durations(spans):
+    """汇总一次运行中每个阶段的总耗时"""
+    totals = {}
+    for record in spans:
+        totals[record["name"]] = totals.get(record["name"], 0.0) + record["duration"]
+    return totals
+
+class RssSampler(threading.Thread):
+    """定期采样子进程及其所有后代进程（Playwright驱动和浏览器）的常驻内存之和，记录峰值"""
+
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            pids = [self.pid] + child_pids(self.pid)
+            self.peak = max(self.peak, sum(process_rss(pid) for pid in pids))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+def run_scenario(name, scenario, extra_env=None):
+    """启动模拟服务器，在临时目录中运行一次main.py
+
+    返回{"ok", "elapsed", "phases", "spans", "started", "peak_rss", "cpu"}，
+    cpu为main.py及已退出的浏览器进程消耗的用户态和内核态CPU秒数
+    """
+    state = MockState(**scenario.get("state", {}))
+    server = MockServer(state).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as tmp:
+            workdir = Path(tmp)
+            write_session_state(workdir, server, scenario.get("session"))
+            trace_file = workdir / "spans.jsonl"
+            env = dict(os.environ)
+            env.pop("BROWSER_PROFILE_DIR", None)
+            env.pop("DEEP_STATUS_API", None)
+            env.update({
+                "DEEPNOTE_BASE_URL": server.base_url,
+                "DEEP_URL": server.notebook_url,
+                "GT_PW": f"{state.username} {state.password}",
+                "KEEPALIVE_TRACE_FILE": str(trace_file),
+            })
+            env.update(scenario.get("env", {}))
+            env.update(extra_env or {})
+
+            usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            started_at = time.time()
+            started = time.monotonic()
+            process = subprocess.Popen(
+                [sys.executable, str(MAIN_SCRIPT)], cwd=workdir, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+            )
+            sampler = RssSampler(process.pid)
+            sampler.start()
+            output, _ = process.communicate()
+            elapsed = time.monotonic() - started
+            sampler.stop()
+            usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+            ok = process.returncode == 0 and "脚本执行成功" in output and state.machine_status() == "running"
+            if not ok:
+                print(f"场景{name}失败，输出末尾:")
+                print("\n".join(output.splitlines()[-20:]))
+            spans = read_spans(trace_file)
+            return {
+                "ok": ok,
+                "elapsed": elapsed,
+                "phases": phase_durations(spans),
+                "spans": spans,
+                "started": started_at,
+                "peak_rss": sampler.peak,
+                "cpu": (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime),
+            }
+    finally:
+        server.stop()
+
+def report(results):
+    header = f"{'场景':<24}{'成功':>6}{'总耗时':>9}" + "".join(f"{phase:>16}" for phase in REPORT_PHASES)
+    print(header)
+    for name, runs in results.items():
+        successes = sum(1 for run in runs if run["ok"])
+        wall = percentile([run["elapsed"] for run in runs], 0.5)
+        line = f"{name:<24}{successes:>3}/{len(runs):<2}{wall:>9.2f}"
+        for phase in REPORT_PHASES:
+            values = [run["phases"][phase] for run in runs if phase in run["phases"]]
+            line += f"{percentile(values, 0.5):>16.2f}" if values else f"{'-':>16}"
+        print(line)
+    print("耗时为多次运行的中位数（秒），'-'表示该阶段未执行")
+
+def time_to_workspace(run):
+    """从启动main.py到登录完成（进入工作区或保活链接）的秒数"""
+    for record in run["spans"]:
+        if record["name"] == "login" and record["status"] == "ok":
+            return record["ts"] + record["duration"] - run["started"]
+    return None
+
+def median_of(runs, value):
+    values = [value(run) for run in runs]
+    values = [v for v in values if v is not None]
+    return percentile(values, 0.5) if values else None
+
+def engine_report(results):
+    print(f"{'引擎':<26}{'成功':>6}{'启动':>9}{'进入工作区':>12}{'峰值内存MB':>12}{'CPU秒':>9}{'总耗时':>9}")
+    for engine, runs in results.items():
+        columns = [
+            median_of(runs, lambda run: run["phases"].get("browser_launch")),
+            median_of(runs, time_to_workspace),
+            median_of(runs, lambda run: run["peak_rss"] / 1024 / 1024),
+            median_of(runs, lambda run: run["cpu"]),
+            median_of(runs, lambda run: run["elapsed"]),
+        ]
+        widths = [9, 12, 12, 9, 9]
+        line = f"{engine:<26}{sum(1 for run in runs if run['ok']):>3}/{len(runs):<2}"
+        for value, width in zip(columns, widths):
+            line += f"{value:>{width}.2f}" if value is not None else f"{'-':>{width}}"
+        print(line)
+    print("数值为多次运行的中位数；每次运行为一轮完整保活（会话有效、机器已停止、点击Run）")
+
+def run_engines(engines, repeat):
+    """在同一场景下依次用各个浏览器引擎运行main.py，比较启动时间、进入工作区时间、峰值内存和CPU"""
+    results = {}
+    for engine in engines:
+        for attempt in range(repeat):
+            print(f"运行引擎{engine}（{attempt + 1}/{repeat}）")
+            run = run_scenario(f"engine-{engine}", SCENARIOS["valid_cookies_stopped"], {"BROWSER_ENGINE": engine})
+            results.setdefault(engine, []).append(run)
+    engine_report(results)
+    return all(run["ok"] for runs in results.values() for run in runs)
+
+if __name__ == "__main__":
+    # python benchmark.py [场景名...]，不指定时运行全部场景；BENCH_REPEAT设置每个场景的运行次数
+    # python benchmark.py engines [引擎...]，比较各浏览器引擎的资源消耗
+    repeat = int(os.environ.get(REPEAT_ENV, "1"))
+    if sys.argv[1:2] == ["engines"]:
+        engines = sys.argv[2:] or list(ENGINES)
+        unknown = [engine for engine in engines if engine not in ENGINES]
+        if unknown:
+            print(f"未知引擎: {', '.join(unknown)}，可选: {', '.join(ENGINES)}")
+            raise SystemExit(1)
+        raise SystemExit(0 if run_engines(engines, repeat) else 1)
+
+    names = sys.argv[1:] or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"未知场景: {', '.join(unknown)}，可选: {', '.join(SCENARIOS)}")
+        raise SystemExit(1)
+
+    results = {}
+    for name in names:
+        for attempt in range(repeat):
+            print(f"运行场景{name}（{attempt + 1}/{repeat}）")
+            results.setdefault(name, []).append(run_scenario(name, SCENARIOS[name]))
+    report(results)
+    raise SystemExit(0 if all(run["ok"] for runs in results.values() for run in runs) else 1)
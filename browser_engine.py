@@ -0,0 +1,57 @@
+import os
+
+# 浏览器引擎，可选firefox（默认）、chromium、chromium-headless-shell
+ENGINE_ENV = "BROWSER_ENGINE"
+DEFAULT_ENGINE = "firefox"
+# 覆盖浏览器自带的User-Agent
+USER_AGENT_ENV = "BROWSER_USER_AGENT"
+
+CHROMIUM_ARGS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-web-security'
+]
+
+# browser_type：playwright上的浏览器类型；channel：Chromium的发行版本，
+# "chromium"为完整浏览器的新版无头模式，不指定时Playwright使用更轻量的chromium-headless-shell；
+# 使用前需先安装对应浏览器，例如python -m playwright install chromium-headless-shell
+ENGINES = {
+    "firefox": {"browser_type": "firefox", "channel": None, "args": []},
+    "chromium": {"browser_type": "chromium", "channel": "chromium", "args": CHROMIUM_ARGS},
+    "chromium-headless-shell": {
+        "browser_type": "chromium", "channel": None, "args": CHROMIUM_ARGS,
+    },
+}
+
+def get_engine():
+    """返回BROWSER_ENGINE配置的引擎名，设置不正确时使用默认的firefox"""
+    engine = os.environ.get(ENGINE_ENV, DEFAULT_ENGINE).strip().lower() or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        print(f"错误: 不支持的{ENGINE_ENV}={engine}，可选{', '.join(ENGINES)}，使用{DEFAULT_ENGINE}")
+        engine = DEFAULT_ENGINE
+    return engine
+
+def browser_type(playwright, engine=None):
+    return getattr(playwright, ENGINES[engine or get_engine()]["browser_type"])
+
+def launch_options(engine=None):
+    """返回launch()和launch_persistent_context()共用的参数"""
+    config = ENGINES[engine or get_engine()]
+    options = {"headless": True, "args": list(config["args"])}
+    if config["channel"]:
+        options["channel"] = config["channel"]
+    return options
+
+def context_options():
+    """返回new_context()的参数，默认使用浏览器自带的User-Agent"""
+    options = {'viewport': {'width': 1280, 'height': 720}}
+    user_agent = os.environ.get(USER_AGENT_ENV, "")
+    if user_agent:
+        options['user_agent'] = user_agent
+    return options
+
+def engine_profile_dir(profile_dir, engine=None):
+    """不同引擎的用户数据目录格式不兼容，非默认引擎使用以引擎名命名的子目录"""
+    engine = engine or get_engine()
+    return profile_dir if engine == DEFAULT_ENGINE else profile_dir / engine
@@ -0,0 +1,104 @@
+import os
+import json
+import shutil
+from pathlib import Path
+
+# 持久化用户数据目录，设置后使用launch_persistent_context并在多次运行间复用
+PROFILE_DIR_ENV = "BROWSER_PROFILE_DIR"
+# 用户数据目录的大小上限（MB），超过后删除缓存目录
+PROFILE_MAX_MB_ENV = "BROWSER_PROFILE_MAX_MB"
+DEFAULT_PROFILE_MAX_MB = 300
+
+# 可以安全删除的缓存目录（Firefox和Chromium），不包含cookie、localStorage和IndexedDB
+CACHE_DIR_NAMES = [
+    "cache2",
+    "startupCache",
+    "thumbnails",
+    "shader-cache",
+    "Cache",
+    "Code Cache",
+    "GPUCache",
+    "GrShaderCache",
+    "ShaderCache",
+    "CacheStorage",
+]
+
+NAVIGATION_TIMINGS_FILE = Path("navigation_timings.json")
+MAX_TIMINGS_PER_KIND = 20
+
+_profile_warm = False
+
+def get_profile_dir():
+    """返回配置的用户数据目录，未配置时返回None"""
+    profile_dir = os.environ.get(PROFILE_DIR_ENV, "")
+    return Path(profile_dir) if profile_dir else None
+
+def get_profile_max_bytes():
+    try:
+        max_mb = int(os.environ.get(PROFILE_MAX_MB_ENV, DEFAULT_PROFILE_MAX_MB))
+    except ValueError:
+        print(f"错误: {PROFILE_MAX_MB_ENV}环境变量设置不正确，使用默认值{DEFAULT_PROFILE_MAX_MB}")
+        max_mb = DEFAULT_PROFILE_MAX_MB
+    return max_mb * 1024 * 1024
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def prune_profile(profile_dir, max_bytes):
+    """用户数据目录超过上限时，从最大的缓存目录开始删除，直到低于上限"""
+    total = dir_size(profile_dir)
+    if total <= max_bytes:
+        return total
+    caches = []
+    for root, dirs, _ in os.walk(profile_dir):
+        for name in list(dirs):
+            if name in CACHE_DIR_NAMES:
+                path = os.path.join(root, name)
+                caches.append((dir_size(path), path))
+                dirs.remove(name)
+    for size, path in sorted(caches, reverse=True):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        print(f"已清理缓存目录 {path}（{size / 1024 / 1024:.1f}MB）")
+    print(f"用户数据目录大小: {total / 1024 / 1024:.1f}MB")
+    return total
+
+def prepare_profile(profile_dir):
+    """启动前清理过大的用户数据目录，并记录本次是否为热启动"""
+    global _profile_warm
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    prune_profile(profile_dir, get_profile_max_bytes())
+    _profile_warm = any(profile_dir.iterdir())
+    print(f"使用持久化用户数据目录 {profile_dir}（{'热启动' if _profile_warm else '冷启动'}）")
+
+def record_navigation(seconds):
+    """记录一次保活链接导航耗时，并打印冷启动与热启动的平均耗时对比"""
+    kind = "warm" if _profile_warm else "cold"
+    try:
+        with open(NAVIGATION_TIMINGS_FILE, "r") as f:
+            timings = json.load(f)
+    except Exception:
+        timings = {}
+    samples = timings.setdefault(kind, [])
+    samples.append(round(seconds, 3))
+    del samples[:-MAX_TIMINGS_PER_KIND]
+    try:
+        with open(NAVIGATION_TIMINGS_FILE, "w") as f:
+            json.dump(timings, f)
+    except Exception as e:
+        print(f"保存导航耗时时出错: {str(e)}")
+
+    summary = []
+    for label, name in (("cold", "冷启动"), ("warm", "热启动")):
+        if timings.get(label):
+            summary.append(f"{name}平均{sum(timings[label]) / len(timings[label]):.2f}秒（{len(timings[label])}次）")
+    print(f"导航耗时{seconds:.2f}秒；" + "，".join(summary))
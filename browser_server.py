@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import tempfile
+from pathlib import Path
+from browser_engine import ENGINES, get_engine, browser_type, launch_options
+
+# 共享浏览器服务：BROWSER_SERVER为空时不使用；为"auto"时读取browser_server.json中记录的地址；
+# 也可以直接设置为ws://地址。连接失败时回退到本地启动浏览器
+SERVER_ENV = "BROWSER_SERVER"
+SERVER_STATE_FILE = Path("browser_server.json")
+SERVER_LOG_FILE = Path("browser_server.log")
+# 共享浏览器服务监听的端口，0表示随机端口
+SERVER_PORT_ENV = "BROWSER_SERVER_PORT"
+CONNECT_TIMEOUT = 5000
+START_TIMEOUT = 30
+
+def load_server_state(state_file=SERVER_STATE_FILE):
+    try:
+        with open(state_file, "r") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+def server_endpoint():
+    """返回(ws地址, 引擎)，未配置或记录的服务已退出时返回(None, None)"""
+    setting = os.environ.get(SERVER_ENV, "").strip()
+    if not setting:
+        return None, None
+    if setting.startswith(("ws://", "wss://")):
+        return setting, get_engine()
+    state = load_server_state()
+    if not state or not process_alive(state.get("pid")):
+        return None, None
+    return state["ws_endpoint"], state["engine"]
+
+def connect_browser(playwright):
+    """连接共享浏览器服务，返回browser；未配置或连接失败时返回None"""
+    endpoint, engine = server_endpoint()
+    if not endpoint:
+        if os.environ.get(SERVER_ENV, "").strip():
+            print("未找到运行中的共享浏览器服务，将在本地启动浏览器")
+        return None
+    try:
+        browser = browser_type(playwright, engine).connect(endpoint, timeout=CONNECT_TIMEOUT)
+        print(f"已连接共享浏览器服务: {endpoint}")
+        return browser
+    except Exception as e:
+        print(f"连接共享浏览器服务失败，将在本地启动浏览器: {str(e)}")
+        return None
+
+async def connect_browser_async(playwright):
+    """connect_browser的async_playwright版本"""
+    endpoint, engine = server_endpoint()
+    if not endpoint:
+        if os.environ.get(SERVER_ENV, "").strip():
+            print("未找到运行中的共享浏览器服务，将在本地启动浏览器")
+        return None
+    try:
+        browser = await browser_type(playwright, engine).connect(endpoint, timeout=CONNECT_TIMEOUT)
+        print(f"已连接共享浏览器服务: {endpoint}")
+        return browser
+    except Exception as e:
+        print(f"连接共享浏览器服务失败，将在本地启动浏览器: {str(e)}")
+        return None
+
+def start_server(engine=None, port=None):
+    """在后台启动playwright launch-server，等待其输出ws地址后写入browser_server.json"""
+    engine = engine or get_engine()
+    state = load_server_state()
+    if state and process_alive(state.get("pid")):
+        print(f"共享浏览器服务已在运行: {state['ws_endpoint']}（进程{state['pid']}）")
+        return state
+
+    if port is None:
+        port = int(os.environ.get(SERVER_PORT_ENV, "0"))
+    config = dict(launch_options(engine), port=port)
+    config_file = tempfile.NamedTemporaryFile("w", suffix=".json", prefix="browser_server_", delete=False)
+    with config_file:
+        json.dump(config, config_file)
+
+    log = open(SERVER_LOG_FILE, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "playwright", "launch-server",
+         "--browser", ENGINES[engine]["browser_type"], "--config", config_file.name],
+        stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, start_new_session=True,
+    )
+    log.close()
+
+    deadline = time.monotonic() + START_TIMEOUT
+    endpoint = None
+    while time.monotonic() < deadline and process.poll() is None:
+        with open(SERVER_LOG_FILE, "r") as f:
+            for line in f:
+                if line.startswith(("ws://", "wss://")):
+                    endpoint = line.strip()
+        if endpoint:
+            break
+        time.sleep(0.2)
+    os.unlink(config_file.name)
+
+    if not endpoint:
+        print(f"共享浏览器服务启动失败，详见{SERVER_LOG_FILE}")
+        if process.poll() is None:
+            process.terminate()
+        return None
+    state = {"ws_endpoint": endpoint, "pid": process.pid, "engine": engine, "started_at": time.time()}
+    with open(SERVER_STATE_FILE, "w") as f:
+        json.dump(state, f)
+    print(f"共享浏览器服务已启动: {endpoint}（{engine}，进程{process.pid}）")
+    return state
+
+def stop_server():
+    state = load_server_state()
+    if not state or not process_alive(state.get("pid")):
+        print("共享浏览器服务未在运行")
+    else:
+        # launch-server以新的会话启动，向整个进程组发送信号以同时结束浏览器
+        try:
+            os.killpg(state["pid"], signal.SIGTERM)
+        except OSError:
+            os.kill(state["pid"], signal.SIGTERM)
+        print(f"已停止共享浏览器服务（进程{state['pid']}）")
+    if SERVER_STATE_FILE.exists():
+        SERVER_STATE_FILE.unlink()
+
+if __name__ == "__main__":
+    # python browser_server.py start|stop|status
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "start":
+        raise SystemExit(0 if start_server() else 1)
+    elif command == "stop":
+        stop_server()
+    elif command == "status":
+        state = load_server_state()
+        if state and process_alive(state.get("pid")):
+            print(f"运行中: {state['ws_endpoint']}（{state['engine']}，进程{state['pid']}）")
+        else:
+            print("共享浏览器服务未在运行")
+            raise SystemExit(1)
+    else:
+        print("用法: python browser_server.py start|stop|status")
+        raise SystemExit(1)
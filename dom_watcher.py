@@ -0,0 +1,253 @@
+import os
+import time
+import asyncio
+from playwright.sync_api import Error
+
+# 设置为0时不安装页面内的状态监听，所有等待回退到Playwright定位器轮询
+WATCHER_ENV = "DOM_WATCHER"
+BINDING_NAME = "__keepaliveNotify"
+
+# 在每个页面中注册window.__keepaliveWatch；只有在Python登记了等待时才连接MutationObserver，
+# 检查"Running"文本和Run/Start按钮，条件成立时完成until()返回的Promise并通过expose_binding推送给Python，没有等待时断开观察
+WATCH_SCRIPT = """
+(() => {
+  if (window.__keepaliveWatch) return;
+  const RUN_LABEL = /\\brun\\b|\\bstart\\b/i;
+  const visible = (el) => {
+    if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) return false;
+    return getComputedStyle(el).visibility !== "hidden";
+  };
+  const runButtonVisible = () => {
+    for (const el of document.querySelectorAll('button, [role="button"]')) {
+      const label = [el.textContent, el.getAttribute("aria-label"), el.getAttribute("class")].join(" ");
+      if (RUN_LABEL.test(label) && visible(el)) return true;
+    }
+    return false;
+  };
+  const snapshot = () => ({
+    running: !!document.body && /Running/.test(document.body.innerText),
+    runButton: !!document.body && runButtonVisible(),
+  });
+  const tests = {
+    running: (state) => state.running,
+    run_button: (state) => state.runButton,
+    status: (state) => state.running || state.runButton,
+  };
+  const waiters = new Map();
+  const notify = (kind, state) => {
+    if (window.%(binding)s) window.%(binding)s(kind, state).catch(() => {});
+  };
+  const disconnect = () => {
+    if (waiters.size) return;
+    observer.disconnect();
+    connected = false;
+  };
+  // 结束kind的等待：result为页面状态、true（Python通知网页请求已带回运行状态）或null（超时）
+  const finish = (kind, result) => {
+    const waiter = waiters.get(kind);
+    if (!waiter) return;
+    clearTimeout(waiter.timer);
+    waiters.delete(kind);
+    for (const resolve of waiter.resolvers) resolve(result);
+    if (result && result !== true) notify(kind, result);
+    disconnect();
+  };
+  // 同一批DOM变化只检查一次
+  let scheduled = false;
+  const check = () => {
+    scheduled = false;
+    if (!waiters.size) return;
+    const state = snapshot();
+    for (const kind of [...waiters.keys()]) {
+      if (tests[kind](state)) finish(kind, state);
+    }
+  };
+  const schedule = () => {
+    if (scheduled) return;
+    scheduled = true;
+    setTimeout(check, 50);
+  };
+  const observer = new MutationObserver(schedule);
+  let connected = false;
+  const connect = () => {
+    if (connected || !document.documentElement) return;
+    observer.observe(document.documentElement, {
+      subtree: true, childList: true, characterData: true,
+      attributes: true, attributeFilter: ["style", "class", "hidden", "aria-label", "disabled"],
+    });
+    connected = true;
+  };
+  const arm = (kind, timeout) => {
+    const state = snapshot();
+    if (tests[kind](state)) return state;
+    const waiter = waiters.get(kind) || { resolvers: [] };
+    clearTimeout(waiter.timer);
+    waiter.timer = setTimeout(() => finish(kind, null), timeout);
+    waiters.set(kind, waiter);
+    connect();
+    return null;
+  };
+  window.__keepaliveWatch = {
+    // 条件已经成立时直接返回状态，否则登记等待并返回null，成立时通过绑定推送（async_playwright使用）
+    arm(kind, timeout) {
+      return arm(tests[kind] ? kind : "status", timeout);
+    },
+    // 返回在条件成立、release或超时时完成的Promise，同步API只需等待这一次调用
+    until(kind, timeout) {
+      if (!tests[kind]) kind = "status";
+      const state = arm(kind, timeout);
+      if (state) return Promise.resolve(state);
+      return new Promise((resolve) => waiters.get(kind).resolvers.push(resolve));
+    },
+    release(kind) {
+      finish(kind, true);
+    },
+  };
+  if (!document.documentElement) document.addEventListener("DOMContentLoaded", () => waiters.size && connect());
+})();
+""" % {"binding": BINDING_NAME}
+
+ARM_EXPRESSION = "([kind, timeout]) => window.__keepaliveWatch ? window.__keepaliveWatch.arm(kind, timeout) : false"
+UNTIL_EXPRESSION = "([kind, timeout]) => window.__keepaliveWatch ? window.__keepaliveWatch.until(kind, timeout) : false"
+RELEASE_EXPRESSION = "(kind) => window.__keepaliveWatch && window.__keepaliveWatch.release(kind)"
+
+_events = {}
+_states = {}
+_installed = set()
+
+def watcher_enabled():
+    return os.environ.get(WATCHER_ENV, "1") != "0"
+
+def on_notify(source, kind, state):
+    """页面推送的状态：{"running": 是否显示Running, "runButton": 是否显示Run/Start按钮}，交给正在等待的wait_for_dom_async"""
+    key = (source["page"], kind)
+    event = _events.get(key)
+    if event is not None:
+        _states[key] = state
+        event.set()
+
+def install_watcher(context):
+    """为上下文中的所有页面安装状态监听，返回是否已安装"""
+    if not watcher_enabled():
+        return False
+    if context not in _installed:
+        context.expose_binding(BINDING_NAME, on_notify)
+        context.add_init_script(WATCH_SCRIPT)
+        _installed.add(context)
+    return True
+
+async def install_watcher_async(context):
+    """install_watcher的async_playwright版本"""
+    if not watcher_enabled():
+        return False
+    if context not in _installed:
+        await context.expose_binding(BINDING_NAME, on_notify)
+        await context.add_init_script(WATCH_SCRIPT)
+        _installed.add(context)
+    return True
+
+def watching(page):
+    return watcher_enabled() and page.context in _installed
+
+def context_destroyed(error):
+    """等待期间页面导航或刷新，旧文档中的等待随之消失，需要在新文档中重新登记"""
+    message = str(error)
+    return "destroyed" in message or "navigat" in message
+
+def wait_for_dom(page, kind, timeout, status=None):
+    """等待页面中kind（"running"、"run_button"或"status"）成立，由页面内的MutationObserver判断，只等待一次Playwright调用
+
+    status为页面的NetworkStatus（见network_status.py），传入时网页请求带回运行状态也会立即结束等待。
+    返回页面状态字典，网页状态为运行时返回True，超时返回None；页面没有安装监听或已关闭时返回False，调用方应回退到定位器
+    """
+    if status is not None and status.current() is True:
+        return True
+    deadline = time.monotonic() + timeout / 1000
+
+    def on_status(running):
+        # 同步API在事件回调中可以调用Playwright方法，通知页面结束等待
+        if running:
+            try:
+                page.evaluate(RELEASE_EXPRESSION, kind)
+            except Error:
+                pass
+
+    if status is not None:
+        status.add_listener(on_status)
+    try:
+        while True:
+            remaining = int((deadline - time.monotonic()) * 1000)
+            if remaining <= 0:
+                return None
+            try:
+                result = page.evaluate(UNTIL_EXPRESSION, [kind, remaining])
+            except Error as e:
+                if page.is_closed() or not context_destroyed(e):
+                    return False
+                continue
+            return result
+    finally:
+        if status is not None:
+            status.remove_listener(on_status)
+
+async def wait_for_dom_async(page, kind, timeout, status=None):
+    """wait_for_dom的async_playwright版本：页面通过绑定推送状态，Python只等待一个asyncio.Event
+
+    页面导航后在新文档的domcontentloaded事件中重新登记等待
+    """
+    if status is not None and status.current() is True:
+        return True
+    key = (page, kind)
+    event = asyncio.Event()
+    _events[key] = event
+    _states.pop(key, None)
+    deadline = time.monotonic() + timeout / 1000
+
+    async def arm():
+        remaining = max(1, int((deadline - time.monotonic()) * 1000))
+        state = await page.evaluate(ARM_EXPRESSION, [kind, remaining])
+        if state is not None and not event.is_set():
+            _states[key] = state
+            event.set()
+
+    async def on_loaded(_):
+        try:
+            await arm()
+        except Error:
+            pass
+
+    def on_status(running):
+        if running and not event.is_set():
+            _states[key] = True
+            event.set()
+
+    page.on("domcontentloaded", on_loaded)
+    if status is not None:
+        status.add_listener(on_status)
+    try:
+        await arm()
+        await asyncio.wait_for(event.wait(), max(0, deadline - time.monotonic()))
+        return _states.pop(key)
+    except asyncio.TimeoutError:
+        return None
+    except Error:
+        return False
+    finally:
+        page.remove_listener("domcontentloaded", on_loaded)
+        if status is not None:
+            status.remove_listener(on_status)
+        if _events.get(key) is event:
+            del _events[key]
+        _states.pop(key, None)
+
+def reset_watcher(context=None):
+    """浏览器或上下文关闭后清理记录"""
+    if context is None:
+        _installed.clear()
+        _states.clear()
+        _events.clear()
+        return
+    _installed.discard(context)
+    for records in (_states, _events):
+        for key in [key for key in records if key[0].context == context]:
+            del records[key]
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from http_probe import HttpClient
+from accounts import split_urls
+
+# 应用对外地址（例如部署出来的网页），可用逗号、空格或换行分隔多个；main.py读取WEB_URL，main2.py读取WEB_URL2
+APP_URL_ENV = "WEB_URL"
+# 单个请求（含重定向）的超时时间（秒）
+HEALTH_TIMEOUT_ENV = "HEALTH_CHECK_TIMEOUT"
+DEFAULT_HEALTH_TIMEOUT = 10
+# 同时检查的地址数
+HEALTH_WORKERS_ENV = "HEALTH_CHECK_WORKERS"
+DEFAULT_HEALTH_WORKERS = 64
+# 上次健康响应的ETag和Last-Modified，下次检查时发送条件请求，服务端返回304即视为健康
+HEALTH_CACHE_FILE = Path("health_cache.json")
+# 命令行检查时把每个地址的结果写入该文件，随后运行的main.py在HEALTH_RESULTS_MAX_AGE秒内直接使用，
+# 不再重复检查；工作流中检查步骤和运行脚本的步骤据此共用一次检查结果
+HEALTH_RESULTS_ENV = "HEALTH_RESULTS_FILE"
+HEALTH_RESULTS_MAX_AGE_ENV = "HEALTH_RESULTS_MAX_AGE"
+DEFAULT_HEALTH_RESULTS_MAX_AGE = 1800
+MAX_REDIRECTS = 5
+
+def get_app_urls(env_name=APP_URL_ENV):
+    return split_urls(os.environ.get(env_name, ''))
+
+def get_float_env(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def load_validators(path=HEALTH_CACHE_FILE):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_validators(validators, path=HEALTH_CACHE_FILE):
+    """先写临时文件再替换，避免中断时留下半个文件"""
+    try:
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(validators, f, indent=2)
+        tmp_path.replace(path)
+    except Exception as e:
+        print(f"保存健康检查缓存时出错: {str(e)}")
+
+def results_file():
+    path = os.environ.get(HEALTH_RESULTS_ENV, "")
+    return Path(path) if path else None
+
+def save_results(results, path=None):
+    """把check_all的结果和检查时间写入HEALTH_RESULTS_FILE（未设置时不写）"""
+    path = path or results_file()
+    if path is None:
+        return
+    try:
+        with open(path, "w") as f:
+            json.dump({"checked_at": time.time(), "results": results}, f, indent=2)
+    except Exception as e:
+        print(f"保存健康检查结果时出错: {str(e)}")
+
+def load_results(urls, path=None):
+    """读取之前保存的检查结果，文件不存在、已超过有效期或缺少某个地址时返回None"""
+    path = path or results_file()
+    if path is None:
+        return None
+    try:
+        with open(path, "r") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    max_age = get_float_env(HEALTH_RESULTS_MAX_AGE_ENV, DEFAULT_HEALTH_RESULTS_MAX_AGE)
+    if time.time() - saved.get("checked_at", 0) > max_age:
+        return None
+    results = saved.get("results", {})
+    if any(url not in results for url in urls if url):
+        return None
+    return {url: results[url] for url in urls if url}
+
+def check_url(client, url, validator=None, timeout=None):
+    """检查一个应用地址，跟随重定向（和curl -L一样），返回{"healthy", "status", "validator", "elapsed"}
+
+    200或条件请求命中的304视为健康；健康时validator为新的ETag/Last-Modified，没有时为None
+    """
+    started = time.monotonic()
+    result = {"healthy": False, "status": None, "validator": None, "elapsed": 0.0}
+    headers = {}
+    if validator:
+        if validator.get("etag"):
+            headers["If-None-Match"] = validator["etag"]
+        if validator.get("last_modified"):
+            headers["If-Modified-Since"] = validator["last_modified"]
+    current = url
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, _ = client.request("GET", current, headers=headers, timeout=timeout)
+            location = response_headers.get("location")
+            if status in (301, 302, 303, 307, 308) and location:
+                current = urljoin(current, location)
+                # 条件请求头只对原地址的响应有意义
+                headers = {}
+                continue
+            break
+    except Exception as e:
+        result["error"] = str(e)
+        result["elapsed"] = time.monotonic() - started
+        return result
+
+    result["status"] = status
+    result["elapsed"] = time.monotonic() - started
+    if status == 304 and validator:
+        result["healthy"] = True
+        result["validator"] = validator
+    elif status == 200:
+        result["healthy"] = True
+        etag = response_headers.get("etag")
+        last_modified = response_headers.get("last-modified")
+        if etag or last_modified:
+            result["validator"] = {"etag": etag, "last_modified": last_modified}
+    return result
+
+def check_all(urls, timeout=None, workers=None, cache_file=HEALTH_CACHE_FILE):
+    """并发检查所有应用地址，共用一个keep-alive连接池，总耗时约等于最慢的一个请求
+
+    返回{url: check_url的结果}
+    """
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+        return {}
+    timeout = timeout or get_float_env(HEALTH_TIMEOUT_ENV, DEFAULT_HEALTH_TIMEOUT)
+    workers = workers or int(get_float_env(HEALTH_WORKERS_ENV, DEFAULT_HEALTH_WORKERS))
+    workers = max(1, min(workers, len(urls)))
+    validators = load_validators(cache_file) if cache_file else {}
+
+    client = HttpClient(timeout=timeout, max_idle_per_host=workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {url: executor.submit(check_url, client, url, validators.get(url), timeout) for url in urls}
+            results = {url: future.result() for url, future in futures.items()}
+    finally:
+        client.close()
+
+    if cache_file:
+        for url, result in results.items():
+            if result["validator"]:
+                validators[url] = result["validator"]
+            else:
+                validators.pop(url, None)
+        save_validators(validators, cache_file)
+    return results
+
+def healthy_targets(targets, app_urls, results):
+    """返回应用地址健康、无需打开浏览器的保活链接
+
+    应用地址与保活链接一一对应（数量相同，按顺序配对）；只配置了一个应用地址时由它代表所有目标，
+    和原来工作流中只检查WEB_URL的行为一致；数量对不上时无法配对，所有目标都交给浏览器
+    """
+    targets = [url for url in targets if url]
+    if not app_urls or not targets:
+        return []
+    if len(app_urls) == 1:
+        return targets if results.get(app_urls[0], {}).get("healthy") else []
+    if len(app_urls) != len(targets):
+        print(f"警告: 应用地址数（{len(app_urls)}）与保活链接数（{len(targets)}）不一致，跳过健康检查结果")
+        return []
+    return [target for target, app_url in zip(targets, app_urls) if results.get(app_url, {}).get("healthy")]
+
+def report(results):
+    for url, result in results.items():
+        state = "健康" if result["healthy"] else "异常"
+        detail = result.get("error") or result["status"]
+        print(f"  {state} {url}（{detail}，{result['elapsed']:.2f}秒）")
+
+if __name__ == "__main__":
+    # python health_check.py [WEB_URL|WEB_URL2]：所有应用地址都健康时退出码为0，工作流据此跳过浏览器保活；
+    # 设置了HEALTH_RESULTS_FILE时保存每个地址的结果，运行脚本时只把应用地址异常的目标交给浏览器
+    env_name = sys.argv[1] if len(sys.argv) > 1 else APP_URL_ENV
+    app_urls = get_app_urls(env_name)
+    if not app_urls:
+        print(f"{env_name}未设置，跳过健康检查")
+        raise SystemExit(1)
+    started = time.monotonic()
+    results = check_all(app_urls)
+    print(f"健康检查：{len(app_urls)}个应用地址，耗时{time.monotonic() - started:.2f}秒")
+    report(results)
+    save_results(results)
+    raise SystemExit(0 if all(result["healthy"] for result in results.values()) else 1)
@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin
+from session_store import STORAGE_STATE_FILE, load_session, get_base_url
+
+# 网页端读取机器/内核状态的JSON接口，例如 "{base}/api/projects/{project_id}/machine"
+# 接口不是公开API，因此只在配置了DEEP_STATUS_API时才读取状态
+STATUS_API_ENV = "DEEP_STATUS_API"
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:91.0) Gecko/20100101 Firefox/91.0'
+RUNNING_STATES = {"running", "ready", "started", "idle", "busy"}
+STOPPED_STATES = {"stopped", "stopping", "off", "hibernated", "hibernating", "starting", "pending", "failed", "dead"}
+
+class HttpClient:
+    """按主机复用keep-alive连接的简单HTTP客户端，多线程使用时每个请求独占一个连接"""
+
+    def __init__(self, timeout=10, max_idle_per_host=4):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def _acquire(self, scheme, netloc):
+        with self.lock:
+            connections = self.idle.get((scheme, netloc))
+            if connections:
+                return connections.pop()
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def _release(self, scheme, netloc, connection):
+        with self.lock:
+            connections = self.idle.setdefault((scheme, netloc), [])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, url, headers=None, timeout=None):
+        """发送请求但不跟随重定向，返回(状态码, 响应头字典, 响应体)"""
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = dict(headers or {})
+        headers.setdefault("User-Agent", USER_AGENT)
+        headers.setdefault("Connection", "keep-alive")
+
+        # 复用的连接可能已被服务端关闭，此时换一个新连接重试一次
+        for attempt in range(2):
+            connection = self._acquire(parts.scheme, parts.netloc)
+            if timeout is not None:
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+            try:
+                connection.request(method, path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            response_headers = {key.lower(): value for key, value in response.getheaders()}
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(parts.scheme, parts.netloc, connection)
+            return response.status, response_headers, body
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle = {}
+
+def load_cookies(state_file=STORAGE_STATE_FILE):
+    """读取保存的会话中的cookie列表，没有保存的会话时返回空列表"""
+    state = load_session(state_file)
+    return state["cookies"] if state else []
+
+def cookie_header(cookies, url):
+    """按域名、路径和过期时间筛选cookie，拼成Cookie请求头"""
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    path = parts.path or "/"
+    now = time.time()
+    pairs = []
+    for cookie in cookies:
+        domain = cookie.get("domain", "").lstrip(".")
+        if not domain or not (host == domain or host.endswith("." + domain)):
+            continue
+        if not path.startswith(cookie.get("path", "/")):
+            continue
+        expires = cookie.get("expires", -1)
+        if expires is not None and 0 < expires < now:
+            continue
+        if cookie.get("secure") and parts.scheme != "https":
+            continue
+        pairs.append(f"{cookie['name']}={cookie['value']}")
+    return "; ".join(pairs)
+
+def get_with_cookies(client, url, cookies, max_redirects=5, timeout=None):
+    """带cookie发送GET请求并手动跟随重定向，返回(最终URL, 状态码, 响应体)"""
+    for _ in range(max_redirects + 1):
+        headers = {}
+        header = cookie_header(cookies, url)
+        if header:
+            headers["Cookie"] = header
+        status, response_headers, body = client.request("GET", url, headers=headers, timeout=timeout)
+        location = response_headers.get("location")
+        if status in (301, 302, 303, 307, 308) and location:
+            url = urljoin(url, location)
+            continue
+        return url, status, body
+    return url, status, body
+
+def is_sign_in_url(url):
+    path = urlsplit(url).path
+    return "/sign-in" in path or "/login" in path
+
+def project_id_from_url(url):
+    """从保活链接中提取项目ID（链接中最后一个UUID）"""
+    matches = re.findall(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", url, re.IGNORECASE)
+    return matches[-1] if matches else None
+
+def find_status(data):
+    """在状态接口返回的JSON中查找机器或内核状态，运行返回True，停止返回False，无法判断返回None"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(value, str) and re.search(r"status|state", key, re.IGNORECASE):
+                state = value.lower()
+                if state in RUNNING_STATES:
+                    return True
+                if state in STOPPED_STATES:
+                    return False
+        for value in data.values():
+            found = find_status(value)
+            if found is not None:
+                return found
+    elif isinstance(data, list):
+        for item in data:
+            found = find_status(item)
+            if found is not None:
+                return found
+    return None
+
+def probe_target(client, url, cookies, base_url, status_api):
+    """探测单个保活链接，返回{"session_valid": ..., "running": ...}，无法判断的项为None"""
+    result = {"session_valid": None, "running": None}
+    final_url, status, _ = get_with_cookies(client, url, cookies)
+    if is_sign_in_url(final_url) or status in (401, 403):
+        result["session_valid"] = False
+        return result
+    if status != 200:
+        return result
+    result["session_valid"] = True
+
+    project_id = project_id_from_url(url)
+    if status_api and project_id:
+        status_url = status_api.format(base=base_url.rstrip("/"), project_id=project_id)
+        final_url, status, body = get_with_cookies(client, status_url, cookies)
+        if status == 200:
+            try:
+                result["running"] = find_status(json.loads(body))
+            except ValueError:
+                pass
+    return result
+
+def probe(urls, cookie_file=STORAGE_STATE_FILE, base_url=None, status_api=None, client=None):
+    """不启动浏览器，用保存的cookie探测会话是否有效以及每个目标是否在运行
+
+    返回{"session_valid": True/False/None, "targets": {url: True/False/None}}
+    """
+    base_url = base_url or get_base_url()
+    if status_api is None:
+        status_api = os.environ.get(STATUS_API_ENV, "")
+    cookies = load_cookies(cookie_file)
+    result = {"session_valid": None, "targets": {url: None for url in urls}}
+    if not cookies or not urls:
+        return result
+
+    owns_client = client is None
+    client = client or HttpClient()
+    try:
+        for url in urls:
+            try:
+                target = probe_target(client, url, cookies, base_url, status_api)
+            except Exception as e:
+                print(f"HTTP探测{url}时出错: {str(e)}")
+                continue
+            if target["session_valid"] is False:
+                # 会话已失效时其余目标也无法判断，直接返回
+                result["session_valid"] = False
+                return result
+            if target["session_valid"]:
+                result["session_valid"] = True
+            result["targets"][url] = target["running"]
+    finally:
+        if owns_client:
+            client.close()
+    return result
+
+if __name__ == "__main__":
+    from main import get_target_urls
+    started = time.monotonic()
+    probe_result = probe(get_target_urls('DEEP_URL'))
+    print(json.dumps(probe_result, ensure_ascii=False, indent=2))
+    print(f"探测耗时{time.monotonic() - started:.2f}秒")
+    all_running = probe_result["session_valid"] and all(probe_result["targets"].values())
+    raise SystemExit(0 if all_running else 1)
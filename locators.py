@@ -0,0 +1,187 @@
+import re
+import json
+from pathlib import Path
+from playwright.sync_api import TimeoutError
+from telemetry import span
+from session_store import write_json_atomic
+
+# 记录每个元素上次成功的定位方法，与deepnote_cookies.json放在一起
+SELECTOR_CACHE_FILE = Path("selector_cache.json")
+
+# 首选方法连续失败超过该次数后，恢复默认的方法顺序
+FAILURE_THRESHOLD = 3
+
+# 每个元素的备选定位方法，按原有的尝试顺序排列，下标+1即日志中的"方法N"
+GITHUB_BUTTON_STRATEGIES = [
+    # 方法1：通过文本精确匹配
+    lambda page: page.get_by_text("Continue with GitHub", exact=True),
+    # 方法2：通过文本部分匹配
+    lambda page: page.get_by_text("GitHub", exact=False),
+    # 方法3：通过XPath查找包含GitHub的按钮或链接
+    lambda page: page.locator('//button[contains(., "GitHub")] | //a[contains(., "GitHub")]'),
+    # 方法4：尝试通过角色查找按钮
+    lambda page: page.get_by_role("button", name=re.compile("GitHub", re.IGNORECASE)),
+]
+
+USERNAME_FIELD_STRATEGIES = [
+    lambda page: page.get_by_label("Username or email address"),
+    lambda page: page.locator('input[name="login"]'),
+    lambda page: page.locator('//input[@id="login_field"] | //input[contains(@placeholder, "username")]'),
+]
+
+PASSWORD_FIELD_STRATEGIES = [
+    lambda page: page.get_by_label("Password"),
+    lambda page: page.locator('input[name="password"]'),
+    lambda page: page.locator('//input[@id="password"] | //input[@type="password"]'),
+]
+
+SIGN_IN_BUTTON_STRATEGIES = [
+    lambda page: page.get_by_role("button", name="Sign in", exact=True),
+    lambda page: page.locator('input[value="Sign in"]'),
+    lambda page: page.locator('//button[contains(text(), "Sign in")] | //input[@value="Sign in"]'),
+    lambda page: page.locator('form button[type="submit"]'),
+]
+
+RUN_BUTTON_STRATEGIES = [
+    # 方法1：通过文本精确匹配
+    lambda page: page.get_by_text("Run", exact=True),
+    # 方法2：通过角色和名称
+    lambda page: page.get_by_role("button", name="Run"),
+    # 方法3：通过XPath
+    lambda page: page.locator('//button[contains(text(), "Run")] | //button[contains(@class, "run")]'),
+    # 方法4：尝试查找包含"run"或"start"的按钮（不区分大小写）
+    lambda page: page.locator('button:has-text("Run"), button:has-text("run"), button:has-text("Start")'),
+]
+
+class SelectorCache:
+    """持久化的定位方法缓存，记录每个元素上次成功的方法、各方法命中次数和首选方法的连续失败次数"""
+
+    def __init__(self, path=SELECTOR_CACHE_FILE, failure_threshold=FAILURE_THRESHOLD):
+        self.path = Path(path)
+        self.failure_threshold = failure_threshold
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"读取定位方法缓存时出错，忽略缓存: {str(e)}")
+                self.entries = {}
+
+    def preferred(self, name):
+        """返回该元素的首选方法下标，没有记录或失败次数超过阈值时返回None"""
+        entry = self.entries.get(name)
+        if not entry or not entry.get("hits"):
+            return None
+        if entry.get("failures", 0) >= self.failure_threshold:
+            return None
+        best, _ = max(entry["hits"].items(), key=lambda item: item[1])
+        return int(best)
+
+    def order(self, name, count):
+        """返回尝试顺序：命中最多的方法排在最前，其余保持默认顺序"""
+        indices = list(range(count))
+        best = self.preferred(name)
+        if best is not None and best < count:
+            indices.remove(best)
+            indices.insert(0, best)
+        return indices
+
+    def record(self, name, index):
+        """记录一次查找结果，index为命中的方法下标，未找到时为None"""
+        best = self.preferred(name)
+        entry = self.entries.setdefault(name, {"last": None, "hits": {}, "failures": 0})
+        if index is not None:
+            entry["last"] = index
+            entry["hits"][str(index)] = entry["hits"].get(str(index), 0) + 1
+        if best is None or index == best:
+            entry["failures"] = 0
+        else:
+            entry["failures"] = entry.get("failures", 0) + 1
+            if entry["failures"] >= self.failure_threshold:
+                # 页面结构已变化，旧的命中次数不再可信，重新从默认顺序开始积累
+                print(f"'{name}'的首选方法{best + 1}连续失败{entry['failures']}次，恢复默认顺序")
+                entry["hits"] = {str(index): 1} if index is not None else {}
+                entry["failures"] = 0
+        self.save()
+
+    def save(self):
+        # 多个工作进程会同时保存，临时文件名带进程号，避免互相覆盖写了一半的文件
+        try:
+            write_json_atomic(self.entries, self.path)
+        except Exception as e:
+            print(f"保存定位方法缓存时出错: {str(e)}")
+
+_selector_cache = None
+
+def get_selector_cache():
+    """返回进程内共享的定位方法缓存，首次调用时从文件加载"""
+    global _selector_cache
+    if _selector_cache is None:
+        _selector_cache = SelectorCache()
+    return _selector_cache
+
+def combine_locators(page, strategies, order):
+    """按order顺序用or_()把备选定位方法合并成一个定位器，任意一种匹配即可"""
+    locators = [(index, strategies[index](page)) for index in order]
+    combined = locators[0][1]
+    for _, locator in locators[1:]:
+        combined = combined.or_(locator)
+    return locators, combined
+
+def any_locator(page, strategies):
+    """返回按默认顺序合并所有备选方法的定位器，用于只关心元素是否出现的等待"""
+    _, combined = combine_locators(page, strategies, range(len(strategies)))
+    return combined
+
+def race_locators(page, strategies, timeout=8000, name=None):
+    """同时等待所有备选定位方法，返回(方法下标, 定位器)，全部超时则返回(None, None)
+
+    最坏情况只花费一次timeout，而不是所有方法超时时间之和。
+    提供name时按定位方法缓存调整优先顺序，并记录本次命中的方法
+    """
+    cache = get_selector_cache() if name else None
+    order = cache.order(name, len(strategies)) if cache else list(range(len(strategies)))
+    locators, combined = combine_locators(page, strategies, order)
+    index, found = None, None
+    with span(f"locator.{name or 'anonymous'}", order=order) as attrs:
+        try:
+            # 只等待可见的匹配；first是DOM顺序中的第一个匹配，它隐藏时（例如每个单元格的Run按钮）会一直等到超时
+            visible = combined.filter(visible=True).first
+            visible.wait_for(state="visible", timeout=timeout)
+            # 合并定位器已经命中，按优先顺序找出是哪一种方法匹配到了可见元素
+            index, found = order[0], visible
+            for candidate_index, locator in locators:
+                candidate = locator.filter(visible=True).first
+                if candidate.is_visible():
+                    index, found = candidate_index, candidate
+                    break
+        except TimeoutError:
+            pass
+        attrs["strategy"] = None if index is None else index + 1
+    if cache:
+        cache.record(name, index)
+    return index, found
+
+async def race_locators_async(page, strategies, timeout=8000, name=None):
+    """race_locators的async_playwright版本"""
+    cache = get_selector_cache() if name else None
+    order = cache.order(name, len(strategies)) if cache else list(range(len(strategies)))
+    locators, combined = combine_locators(page, strategies, order)
+    index, found = None, None
+    with span(f"locator.{name or 'anonymous'}", order=order) as attrs:
+        try:
+            visible = combined.filter(visible=True).first
+            await visible.wait_for(state="visible", timeout=timeout)
+            index, found = order[0], visible
+            for candidate_index, locator in locators:
+                candidate = locator.filter(visible=True).first
+                if await candidate.is_visible():
+                    index, found = candidate_index, candidate
+                    break
+        except TimeoutError:
+            pass
+        attrs["strategy"] = None if index is None else index + 1
+    if cache:
+        cache.record(name, index)
+    return index, found
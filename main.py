@@ -1,300 +1,358 @@
-import re
 import os
+import sys
 import time
-import json
-from pathlib import Path
+from collections import OrderedDict
+from urllib.parse import urlsplit
 from playwright.sync_api import Playwright, sync_playwright, expect, TimeoutError
+from locators import (
+    GITHUB_BUTTON_STRATEGIES, USERNAME_FIELD_STRATEGIES, PASSWORD_FIELD_STRATEGIES,
+    SIGN_IN_BUTTON_STRATEGIES, RUN_BUTTON_STRATEGIES, race_locators, any_locator,
+)
+from readiness import track_network, wait_ready, report_readiness, reset_readiness
+from network_status import track_status, reset_status
+from dom_watcher import install_watcher, watching, wait_for_dom, reset_watcher
+from http_probe import probe
+from health_check import get_app_urls, check_all, load_results, healthy_targets, report as report_health
+from routing import install_routing
+from browser_profile import get_profile_dir, prepare_profile, record_navigation
+from browser_engine import get_engine, browser_type, launch_options, context_options, engine_profile_dir
+from browser_server import connect_browser
+from session_store import (
+    STORAGE_STATE_FILE, SESSION_INDEX_FILE, load_session, session_status, local_storage_script,
+    SessionLock, session_lock_timeout, session_version, refreshed_session,
+    save_session, get_base_url, session_alive,
+)
+from process_stats import browser_rss
+from accounts import default_account, split_urls
+from scheduler import AdaptiveScheduler
+from telemetry import span, traced, start_span, end_span
+import metrics
+from waits import wait_until, pause
+from retry_policy import RetryPolicy, start_deadline, expired, clamp, clamp_ms
 
-def login_with_cookie_or_password(page, context, username, password):
-    """先尝试cookie登录，失败后执行密码登录流程"""
-    cookie_file = Path("deepnote_cookies.json")
-    cookie_login_successful = False
-    
-    # 先尝试使用cookie登录
-    if cookie_file.exists():
-        try:
-            print("尝试使用cookie登录")
-            with open(cookie_file, "r") as f:
-                cookies = json.load(f)
-            context.add_cookies(cookies)
-            print("已加载cookies")
-            
-            # 通过导航到登录页面测试cookies是否有效
-            if page.url != "https://deepnote.com/sign-in":
-                try:
-                    # 增加重试机制和更短的超时时间
-                    for attempt in range(3):
-                        try:
-                            print(f"Cookie登录导航尝试 {attempt + 1}/3")
-                            page.goto("https://deepnote.com/sign-in", timeout=30000, wait_until="domcontentloaded")
-                            print("已导航到DeepNote登录页面")
-                            break
-                        except TimeoutError:
-                            if attempt < 2:
-                                print(f"导航超时，等待5秒后重试...")
-                                time.sleep(5)
-                            else:
-                                raise
-                except TimeoutError:
-                    print("多次尝试导航失败，cookie登录失败")
-                    return False
-            
-            # 等待看是否重定向到工作区
-            try:
-                page.wait_for_url("**/workspace/**", timeout=8000)
-                current_url = page.url
-                if re.match(r"https://deepnote.com/workspace/.*", current_url):
-                    print("Cookie登录成功，导航到工作区")
-                    cookie_login_successful = True
-                else:
-                    print("Cookie登录可能失败，URL不匹配工作区模式")
-            except TimeoutError:
-                print("Cookie登录失败，URL未变更为工作区")
-        except Exception as e:
-            print(f"加载或使用cookies时出错: {str(e)}")
-    else:
-        print("未找到cookie文件，将使用密码登录")
-    
-    # 如果cookie登录失败，执行密码登录
-    if not cookie_login_successful:
+# 点击Run后等待"Running"出现的最长时间（秒）
+RUN_START_TIMEOUT = 30
+# 导航到保活链接后等待状态或Run按钮渲染的最长时间（秒）
+PAGE_READY_TIMEOUT = 3
+# 页面操作（没有单独指定超时的click、fill等）的默认超时（毫秒），设置时限制在运行的剩余预算内
+PAGE_TIMEOUT = 30000
+# 一次性运行只检查调度状态（schedule_state.json）中已到检查时间的目标，设置为1时检查所有目标
+FORCE_CHECK_ENV = "KEEPALIVE_FORCE_CHECK"
+
+def deepnote_url(path=""):
+    """拼出DeepNote页面地址，DEEPNOTE_BASE_URL指向模拟服务器时使用模拟服务器的地址"""
+    return get_base_url() + path
+
+def is_deepnote_url(url):
+    host = urlsplit(url).hostname or ""
+    base_host = urlsplit(get_base_url()).hostname or ""
+    return host == base_host or host.endswith("." + base_host)
+
+def is_workspace_url(url):
+    return url.startswith(deepnote_url("/workspace/"))
+
+def adopt_session(page, context, state, target_url=None):
+    """使用其他进程刚保存的会话，验证通过返回True"""
+    try:
+        context.add_cookies(state["cookies"])
+        if state.get("origins"):
+            context.add_init_script(local_storage_script(state))
+        if target_url:
+            page.goto(target_url, timeout=clamp_ms(30000), wait_until="domcontentloaded")
+            return "sign-in" not in page.url
+        page.goto(deepnote_url("/sign-in"), timeout=clamp_ms(30000), wait_until="domcontentloaded")
+        page.wait_for_url("**/workspace/**", timeout=clamp_ms(8000))
+        return True
+    except Exception as e:
+        print(f"使用新会话时出错: {str(e)}")
+        return False
+
+def password_login(page, context, username, password, state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE):
+    """执行密码登录流程并保存会话快照，无法打开登录页面时返回False"""
+    with span("login.password"):
         print("执行密码登录流程")
-        
+    
         # 导航到DeepNote登录页面，使用重试机制
-        if page.url != "https://deepnote.com/sign-in":
-            success = False
-            for attempt in range(3):
-                try:
-                    print(f"密码登录导航尝试 {attempt + 1}/3")
-                    page.goto("https://deepnote.com/sign-in", timeout=15000, wait_until="domcontentloaded")
-                    print("已导航到DeepNote登录页面")
-                    success = True
-                    break
-                except TimeoutError:
-                    if attempt < 2:
-                        print(f"导航超时，等待10秒后重试...")
-                        time.sleep(10)
-                    else:
-                        print("多次导航尝试失败")
-                        return False
-            
-            if not success:
-                return False
-            
-            # 等待页面完全加载，使用较短超时
+        if page.url != deepnote_url("/sign-in"):
             try:
-                page.wait_for_load_state("networkidle", timeout=20000)
+                RetryPolicy("navigate").call(
+                    lambda: page.goto(deepnote_url("/sign-in"), timeout=clamp_ms(15000), wait_until="domcontentloaded"),
+                    retry_on=(TimeoutError,), label="密码登录导航", page=page)
+                print("已导航到DeepNote登录页面")
             except TimeoutError:
-                print("等待页面网络空闲超时，但继续执行")
-        
-        # 等待登录选项加载
-        time.sleep(3)
+                print("多次导航尝试失败")
+                return False
         
-        # 尝试多种方法找到GitHub登录按钮
+            # 等待登录选项出现，代替等待网络空闲
+            if not wait_ready(page, "登录页面", locator=any_locator(page, GITHUB_BUTTON_STRATEGIES), timeout=clamp_ms(20000)):
+                print("等待登录选项出现超时，但继续执行")
+    
+        # 登录选项无需固定等待，下面的按钮查找一旦按钮出现就会立即返回
+    
+        # 同时等待所有方法找到GitHub登录按钮
         github_clicked = False
         try:
-            # 方法1：通过文本精确匹配
-            try:
-                github_button = page.get_by_text("Continue with GitHub", exact=True)
-                github_button.wait_for(state="visible", timeout=8000)
+            index, github_button = race_locators(page, GITHUB_BUTTON_STRATEGIES, timeout=clamp_ms(8000), name="github_button")
+            if github_button:
                 github_button.click()
                 github_clicked = True
-                print("点击GitHub登录按钮（方法1）")
-            except TimeoutError:
-                # 方法2：通过文本部分匹配
-                try:
-                    github_button = page.get_by_text("GitHub", exact=False)
-                    github_button.wait_for(state="visible", timeout=5000)
-                    github_button.click()
-                    github_clicked = True
-                    print("点击GitHub登录按钮（方法2）")
-                except TimeoutError:
-                    # 方法3：通过XPath查找包含GitHub的按钮或链接
-                    try:
-                        github_button = page.locator('//button[contains(., "GitHub")] | //a[contains(., "GitHub")]')
-                        github_button.wait_for(state="visible", timeout=5000)
-                        github_button.click()
-                        github_clicked = True
-                        print("点击GitHub登录按钮（方法3）")
-                    except TimeoutError:
-                        # 方法4：尝试通过角色查找按钮
-                        try:
-                            github_button = page.get_by_role("button", name=re.compile("GitHub", re.IGNORECASE))
-                            github_button.wait_for(state="visible", timeout=5000)
-                            github_button.click()
-                            github_clicked = True
-                            print("点击GitHub登录按钮（方法4）")
-                        except TimeoutError:
-                            print("无法找到GitHub登录按钮")
+                print(f"点击GitHub登录按钮（方法{index + 1}）")
+            else:
+                print("无法找到GitHub登录按钮")
         except Exception as e:
             print(f"点击GitHub登录按钮时出错: {str(e)}")
-        
+    
         if not github_clicked:
             print("未找到GitHub登录按钮，尝试直接输入凭据")
-        
-        # 等待页面加载完成
-        try:
-            page.wait_for_load_state("networkidle", timeout=20000)
-        except TimeoutError:
-            print("等待页面加载超时，但继续执行")
-        
-        time.sleep(3)
-        
-        # 等待用户名字段并输入凭据
+    
+        # 等待GitHub登录表单出现，代替等待网络空闲
+        if not wait_ready(page, "GitHub登录表单", locator=any_locator(page, USERNAME_FIELD_STRATEGIES), timeout=clamp_ms(20000)):
+            print("等待GitHub登录表单超时，但继续执行")
+    
+        # 等待用户名字段并输入凭据（输入框出现即结束等待）
         try:
-            # 尝试多种方式定位用户名输入框
+            # 同时尝试多种方式定位用户名输入框
             username_filled = False
-            try:
-                username_field = page.get_by_label("Username or email address")
-                username_field.wait_for(state="visible", timeout=8000)
+            index, username_field = race_locators(page, USERNAME_FIELD_STRATEGIES, timeout=clamp_ms(8000), name="username_field")
+            if username_field:
                 username_field.click()
                 username_field.fill(username)
                 username_filled = True
-                print("已输入用户名（方法1）")
-            except TimeoutError:
-                try:
-                    username_field = page.locator('input[name="login"]')
-                    username_field.wait_for(state="visible", timeout=5000)
-                    username_field.click()
-                    username_field.fill(username)
-                    username_filled = True
-                    print("已输入用户名（方法2）")
-                except TimeoutError:
-                    try:
-                        username_field = page.locator('//input[@id="login_field"] | //input[contains(@placeholder, "username")]')
-                        username_field.wait_for(state="visible", timeout=5000)
-                        username_field.click()
-                        username_field.fill(username)
-                        username_filled = True
-                        print("已输入用户名（方法3）")
-                    except TimeoutError:
-                        print("未找到用户名字段")
+                print(f"已输入用户名（方法{index + 1}）")
+            else:
+                print("未找到用户名字段")
         except Exception as e:
             print(f"输入用户名时出错: {str(e)}")
-        
+    
         # 等待密码字段并输入凭据
         try:
-            # 尝试多种方式定位密码输入框
+            # 同时尝试多种方式定位密码输入框
             password_filled = False
-            try:
-                password_field = page.get_by_label("Password")
-                password_field.wait_for(state="visible", timeout=8000)
+            index, password_field = race_locators(page, PASSWORD_FIELD_STRATEGIES, timeout=clamp_ms(8000), name="password_field")
+            if password_field:
                 password_field.click()
                 password_field.fill(password)
                 password_filled = True
-                print("已输入密码（方法1）")
-            except TimeoutError:
-                try:
-                    password_field = page.locator('input[name="password"]')
-                    password_field.wait_for(state="visible", timeout=5000)
-                    password_field.click()
-                    password_field.fill(password)
-                    password_filled = True
-                    print("已输入密码（方法2）")
-                except TimeoutError:
-                    try:
-                        password_field = page.locator('//input[@id="password"] | //input[@type="password"]')
-                        password_field.wait_for(state="visible", timeout=5000)
-                        password_field.click()
-                        password_field.fill(password)
-                        password_filled = True
-                        print("已输入密码（方法3）")
-                    except TimeoutError:
-                        print("未找到密码字段")
+                print(f"已输入密码（方法{index + 1}）")
+            else:
+                print("未找到密码字段")
         except Exception as e:
             print(f"输入密码时出错: {str(e)}")
-        
+    
         # 点击登录按钮
+        login_clicked = False
         try:
-            # 尝试多种方式定位登录按钮
-            login_clicked = False
-            try:
-                sign_in_button = page.get_by_role("button", name="Sign in", exact=True)
-                sign_in_button.wait_for(state="visible", timeout=8000)
+            # 同时尝试多种方式定位登录按钮
+            index, sign_in_button = race_locators(page, SIGN_IN_BUTTON_STRATEGIES, timeout=clamp_ms(8000), name="sign_in_button")
+            if sign_in_button:
                 sign_in_button.click()
                 login_clicked = True
-                print("已点击登录按钮（方法1）")
-            except TimeoutError:
+                print(f"已点击登录按钮（方法{index + 1}）")
+            else:
+                print("未找到登录按钮")
+        except Exception as e:
+            print(f"点击登录按钮时出错: {str(e)}")
+    
+        if login_clicked:
+            # 等待登录后跳转回DeepNote，代替等待网络空闲
+            if wait_ready(page, "登录后跳转", url=lambda u: is_deepnote_url(u) and "sign-in" not in u, timeout=clamp_ms(20000)):
+                print("登录完成，已跳转回DeepNote")
+            
+                # 保存成功登录后的会话快照（cookies和localStorage）
                 try:
-                    sign_in_button = page.locator('input[value="Sign in"]')
-                    sign_in_button.wait_for(state="visible", timeout=5000)
-                    sign_in_button.click()
-                    login_clicked = True
-                    print("已点击登录按钮（方法2）")
-                except TimeoutError:
+                    save_session(context, state_file, index_file)
+                    print("已将会话快照保存到文件")
+                except Exception as e:
+                    print(f"保存会话快照时出错: {str(e)}")
+            else:
+                print("登录后页面跳转超时，但继续执行")
+    return True
+
+@traced("login")
+def login_with_cookie_or_password(page, context, username, password, target_url=None,
+                                 state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE, skip_cookie=False):
+    """先尝试用保存的会话登录，失败后执行密码登录流程
+
+    会话快照按cookie过期时间索引：已过期时直接进行密码登录；
+    未过期且提供了target_url时直接打开保活链接验证，不再经过登录页面；
+    state_file和index_file为该账号的会话快照文件（见session_store.account_session_files）；
+    skip_cookie为True时（HTTP探测已确认保存的会话失效）不再尝试cookie登录，直接进行密码登录
+    """
+    cookie_login_successful = False
+    version = session_version(state_file)
+    state = load_session(state_file)
+    status = "invalid" if skip_cookie else session_status(state, index_file)
+    
+    # 先尝试使用保存的会话登录
+    with span("login.cookie", session=status) as cookie_attrs:
+        if status == "missing":
+            print("未找到保存的会话，将使用密码登录")
+        elif status == "expired":
+            print("保存的登录cookie已过期，跳过cookie登录")
+        elif status == "invalid":
+            print("HTTP探测已确认保存的会话失效，跳过cookie登录")
+        else:
+            if status == "unknown":
+                print("保存的会话中没有可识别的登录cookie，无法按过期时间判断，尝试直接使用")
+            try:
+                print("尝试使用保存的会话登录")
+                context.add_cookies(state["cookies"])
+                if state.get("origins"):
+                    context.add_init_script(local_storage_script(state))
+                print("已加载cookies和localStorage")
+            
+                if target_url:
+                    # 直接打开保活链接，没有被重定向到登录页面即说明会话有效
                     try:
-                        sign_in_button = page.locator('//button[contains(text(), "Sign in")] | //input[@value="Sign in"]')
-                        sign_in_button.wait_for(state="visible", timeout=5000)
-                        sign_in_button.click()
-                        login_clicked = True
-                        print("已点击登录按钮（方法3）")
+                        print("直接导航到保活链接验证会话")
+                        navigation_started = time.monotonic()
+                        with span("navigate", url=target_url):
+                            page.goto(target_url, timeout=clamp_ms(30000), wait_until="domcontentloaded")
+                        if "sign-in" not in page.url:
+                            print("会话有效，已进入保活链接")
+                            cookie_login_successful = True
+                            record_page_ready(page, navigation_started)
+                        else:
+                            print("会话无效，已被重定向到登录页面")
                     except TimeoutError:
+                        print("导航到保活链接超时，cookie登录失败")
+                else:
+                    # 通过导航到登录页面测试cookies是否有效
+                    if page.url != deepnote_url("/sign-in"):
                         try:
-                            sign_in_button = page.locator('form button[type="submit"]')
-                            sign_in_button.wait_for(state="visible", timeout=5000)
-                            sign_in_button.click()
-                            login_clicked = True
-                            print("已点击登录按钮（方法4）")
+                            # 超时按导航的重试策略重试，每次的超时不超过运行的剩余预算
+                            RetryPolicy("navigate").call(
+                                lambda: page.goto(deepnote_url("/sign-in"), timeout=clamp_ms(30000), wait_until="domcontentloaded"),
+                                retry_on=(TimeoutError,), label="Cookie登录导航", page=page)
+                            print("已导航到DeepNote登录页面")
                         except TimeoutError:
-                            print("未找到登录按钮")
-        except Exception as e:
-            print(f"点击登录按钮时出错: {str(e)}")
-        
-        if login_clicked:
-            # 等待登录后的导航
-            try:
-                page.wait_for_load_state("networkidle", timeout=20000)
-                print("登录完成，页面已加载")
+                            print("多次尝试导航失败，cookie登录失败")
+                            return False
                 
-                # 保存成功登录后的cookies
-                try:
-                    cookies = context.cookies()
-                    with open(cookie_file, "w") as f:
-                        json.dump(cookies, f)
-                    print("已将cookies保存到文件")
-                except Exception as e:
-                    print(f"保存cookies时出错: {str(e)}")
-                    
-            except TimeoutError:
-                print("登录后页面加载超时，但继续执行")
+                    # 等待看是否重定向到工作区
+                    try:
+                        page.wait_for_url("**/workspace/**", timeout=clamp_ms(8000))
+                        current_url = page.url
+                        if is_workspace_url(current_url):
+                            print("Cookie登录成功，导航到工作区")
+                            cookie_login_successful = True
+                        else:
+                            print("Cookie登录可能失败，URL不匹配工作区模式")
+                    except TimeoutError:
+                        print("Cookie登录失败，URL未变更为工作区")
+            except Exception as e:
+                print(f"加载或使用cookies时出错: {str(e)}")
+        cookie_attrs["success"] = cookie_login_successful
+    
+    # 如果cookie登录失败，执行密码登录；同一账号同时只有一个进程执行密码登录（见session_store.SessionLock），
+    # 等待期间其他进程保存了新会话时直接使用它
+    if not cookie_login_successful:
+        with SessionLock(state_file, timeout=clamp(session_lock_timeout())):
+            fresh_state = refreshed_session(version, state_file, index_file)
+            if fresh_state and adopt_session(page, context, fresh_state, target_url):
+                print("已使用其他进程刚保存的会话")
+            elif not password_login(page, context, username, password, state_file, index_file):
+                return False
     
     # 检查最终登录状态
     login_successful = False
-    try:
-        page.wait_for_url("**/workspace/**", timeout=10000)
-        current_url = page.url
-        if re.match(r"https://deepnote.com/workspace/.*", current_url):
-            print("登录成功，导航到工作区")
-            login_successful = True
-        else:
+    with span("login.verify"):
+        try:
+            page.wait_for_url("**/workspace/**", timeout=clamp_ms(10000))
+            current_url = page.url
+            if is_workspace_url(current_url):
+                print("登录成功，导航到工作区")
+                login_successful = True
+            else:
+                print("登录可能失败，未导航到工作区")
+        except TimeoutError:
             print("登录可能失败，未导航到工作区")
-    except TimeoutError:
-        print("登录可能失败，未导航到工作区")
-        # 尝试检查当前URL是否包含登录成功的迹象
-        current_url = page.url
-        if "deepnote.com" in current_url and "sign-in" not in current_url:
-            print("可能已登录成功（基于URL判断）")
-            login_successful = True
+            # 尝试检查当前URL是否包含登录成功的迹象
+            current_url = page.url
+            if is_deepnote_url(current_url) and "sign-in" not in current_url:
+                print("可能已登录成功（基于URL判断）")
+                login_successful = True
     
     return login_successful
 
+def running_text_visible(page):
+    """立即检查页面上是否可见"Running"文本，不等待"""
+    try:
+        return page.locator("text=/Running/").filter(visible=True).first.is_visible()
+    except Exception:
+        return False
+
+def app_ui_visible(page):
+    """立即检查页面上是否已渲染出运行状态或Run按钮，不等待"""
+    try:
+        combined = any_locator(page, RUN_BUTTON_STRATEGIES)
+        return running_text_visible(page) or combined.filter(visible=True).first.is_visible()
+    except Exception:
+        return False
+
+def record_page_ready(page, started):
+    """等待运行状态或Run按钮渲染出来（最多PAGE_READY_TIMEOUT秒），记录从started开始的导航耗时，超时同样记录"""
+    ready = wait_until(lambda: app_ui_visible(page), clamp(PAGE_READY_TIMEOUT), page=page)
+    if not ready:
+        print(f"页面在{PAGE_READY_TIMEOUT}秒内没有渲染出运行状态或Run按钮，按超时记录导航耗时")
+    record_navigation(time.monotonic() - started)
+    return ready
+
+@traced("post_click_wait")
+def wait_until_running(page, timeout=RUN_START_TIMEOUT):
+    """等待网页收到运行状态或出现"Running"文本，出现即返回True，超过timeout秒（不超过运行的剩余预算）返回False"""
+    timeout = clamp(timeout)
+    started = time.monotonic()
+    network_status = track_status(page)
+    # 页面在"Running"出现时结束等待，网页请求带回运行状态时也立即结束
+    state = wait_for_dom(page, "running", timeout * 1000, network_status) if watching(page) else False
+    if state is not False:
+        running = bool(state)
+    else:
+        # 文本检查本身会让Playwright分发事件，网页收到的状态因此能及时更新
+        running = wait_until(lambda: network_status.current() is True or running_text_visible(page), timeout, page=page)
+    if running:
+        print(f"应用在{time.monotonic() - started:.1f}秒后进入运行状态")
+    else:
+        print(f"等待{timeout}秒后仍未看到'Running'文本")
+    return running
+
+@traced("status_check")
 def is_app_running(page):
-    """检查应用是否正在运行，要求同时满足：
-    1. 存在"Running"字样（大写R开头）
-    2. 存在停止按钮
+    """检查应用是否正在运行
+
+    优先使用网页自己的请求和WebSocket消息带回的机器状态（见network_status.py），
+    NETWORK_STATUS_TIMEOUT秒内没有收到时回退到检查页面上的"Running"文本（大写R开头）
     """
+    network_status = track_status(page)
+    running = network_status.wait(page)
+    if running is not None:
+        print(f"应用状态检查（网络）：{'运行中' if running else '未运行'}，来源{network_status.source}")
+        return running
+    
+    if watching(page):
+        # 在页面内等待运行状态或Run按钮出现；只出现了按钮时再给"Running"文本最多3秒
+        state = wait_for_dom(page, "status", clamp_ms(10000))
+        if state is not False:
+            if state and not state["running"]:
+                state = wait_for_dom(page, "running", clamp_ms(3000))
+            running = bool(state and state["running"])
+            print(f"应用状态检查（页面监听）：{'运行中' if running else '未运行'}")
+            return running
+    
     try:
-        # 等待页面加载
-        try:
-            page.wait_for_load_state("networkidle", timeout=10000)
-        except TimeoutError:
-            print("等待页面加载超时，但继续检查")
+        # 等待运行状态或Run按钮渲染出来，代替等待网络空闲
+        status_locator = page.locator("text=/Running/").or_(
+            any_locator(page, RUN_BUTTON_STRATEGIES))
+        if not wait_ready(page, "应用状态", locator=status_locator, timeout=clamp_ms(10000)):
+            print("等待应用状态出现超时，但继续检查")
         
         # 条件1：检查是否存在"Running"文本（必须大写R开头）
         running_text_found = False
         try:
             # 使用精确匹配大写开头的"Running"文本
-            running_text_elements = page.locator("text=/Running/")
-            running_text_elements.first.wait_for(state="visible", timeout=3000)
+            running_text_elements = page.locator("text=/Running/").filter(visible=True)
+            running_text_elements.first.wait_for(state="visible", timeout=clamp_ms(3000))
             found_text = running_text_elements.first.text_content()
             print(f"找到运行状态文本: '{found_text}'")
             
@@ -319,59 +377,112 @@ def is_app_running(page):
         print(f"应用状态检查出错，假设未运行: {str(e)}")
         return False
 
+@traced("run_click")
 def try_click_run_button(page):
     """尝试点击Run按钮"""
     try:
-        # 等待页面完全加载
-        try:
-            page.wait_for_load_state("networkidle", timeout=20000)
-        except TimeoutError:
-            print("等待页面加载超时，但继续执行")
+        # 等待Run按钮出现，代替等待网络空闲；安装了页面监听时由页面在按钮出现时通知
+        state = wait_for_dom(page, "run_button", clamp_ms(20000)) if watching(page) else False
+        if state is False:
+            if not wait_ready(page, "Run按钮", locator=any_locator(page, RUN_BUTTON_STRATEGIES), timeout=clamp_ms(20000)):
+                print("等待Run按钮出现超时，但继续执行")
+        elif state is None:
+            print("等待Run按钮出现超时，但继续执行")
         
-        # 尝试多种方式定位Run按钮
+        # 同时尝试多种方式定位Run按钮
         run_button_found = False
-        
-        # 方法1：通过文本精确匹配
-        try:
-            run_button = page.get_by_text("Run", exact=True)
-            run_button.wait_for(state="visible", timeout=8000)
+        index, run_button = race_locators(page, RUN_BUTTON_STRATEGIES, timeout=clamp_ms(8000), name="run_button")
+        if run_button:
             run_button.click()
             run_button_found = True
-            print("点击了'Run'按钮（方法1）")
-        except TimeoutError:
-            # 方法2：通过角色和名称
-            try:
-                run_button = page.get_by_role("button", name="Run")
-                run_button.wait_for(state="visible", timeout=3000)
-                run_button.click()
-                run_button_found = True
-                print("点击了'Run'按钮（方法2）")
-            except TimeoutError:
-                # 方法3：通过XPath
-                try:
-                    run_button = page.locator('//button[contains(text(), "Run")] | //button[contains(@class, "run")]')
-                    run_button.wait_for(state="visible", timeout=3000)
-                    run_button.click()
-                    run_button_found = True
-                    print("点击了'Run'按钮（方法3）")
-                except TimeoutError:
-                    # 方法4：尝试查找包含"run"或"start"的按钮（不区分大小写）
-                    try:
-                        run_button = page.locator('button:has-text("Run"), button:has-text("run"), button:has-text("Start")')
-                        run_button.wait_for(state="visible", timeout=3000)
-                        run_button.click()
-                        run_button_found = True
-                        print("点击了运行按钮（方法4）")
-                    except TimeoutError:
-                        print("尝试了多种方法但未找到'Run'按钮")
+            print(f"点击了'Run'按钮（方法{index + 1}）")
+        else:
+            print("尝试了多种方法但未找到'Run'按钮")
         
         return run_button_found
     except Exception as e:
         print(f"尝试点击'Run'按钮时出错: {str(e)}")
         return False
 
-def run(playwright: Playwright) -> None:
-    # 从环境变量获取凭据
+def get_target_urls(env_name='DEEP_URL'):
+    """从环境变量读取保活链接，多个链接可用逗号、空格或换行分隔"""
+    return split_urls(os.environ.get(env_name, ''))
+
+@traced("target")
+def keep_target_alive(page, url, observation=None, reload=False):
+    """在指定页面上导航到保活链接并确保应用运行，返回应用是否正在运行
+
+    传入observation字典时记录检查时应用是否已在运行（was_running）以及是否点击了Run（restarted）；
+    reload为True时即使页面已经在该链接上也重新导航（重试或复用页面时页面内容已经过时）
+    """
+    # 导航到指定URL（如果提供，登录时已经打开该链接则不再重复导航）
+    if url and (page.url != url or reload):
+        try:
+            print(f"导航到指定的deepnode保活链接: {url}")
+            navigation_started = time.monotonic()
+            with span("navigate", url=url):
+                page.goto(url, timeout=clamp_ms(60000), wait_until="domcontentloaded")
+            print(f"已导航到指定的deepnode保活链接")
+            record_page_ready(page, navigation_started)
+        except TimeoutError:
+            print(f"导航到deepnode保活链接时超时，但继续执行")
+        except Exception as e:
+            print(f"导航时出错: {str(e)}")
+    
+    # 检查应用是否正在运行
+    app_running = is_app_running(page)
+    if observation is not None and observation.get("was_running") is None:
+        observation["was_running"] = app_running
+    
+    # 如果应用未运行，尝试点击"Run"按钮
+    if not app_running:
+        click_success = try_click_run_button(page)
+        if observation is not None and click_success:
+            observation["restarted"] = True
+        
+        if click_success:
+            # 等待"Running"出现后再完整检查一次，最多等待RUN_START_TIMEOUT秒
+            print(f"等待应用启动，最多{RUN_START_TIMEOUT}秒")
+            if wait_until_running(page):
+                app_running = is_app_running(page)
+    
+    return app_running
+
+def launch_browser(playwright):
+    """连接共享浏览器服务（配置了BROWSER_SERVER时）或在本地启动浏览器，返回browser"""
+    browser = connect_browser(playwright)
+    if browser is None:
+        # 按BROWSER_ENGINE启动浏览器，只传入该引擎支持的参数
+        browser = browser_type(playwright).launch(**launch_options())
+    return browser
+
+def launch_context(playwright, profile_name=None):
+    """启动浏览器并创建上下文，返回(browser, context)
+
+    浏览器引擎由BROWSER_ENGINE选择（见browser_engine.py）；
+    配置了BROWSER_PROFILE_DIR时使用launch_persistent_context复用用户数据目录，
+    此时browser为None，关闭context即关闭浏览器，profile_name不为空时使用以它命名的子目录（非默认账号）；
+    连接共享浏览器服务时关闭browser只会断开连接，不会关闭服务中的浏览器
+    """
+    engine = get_engine()
+    profile_dir = get_profile_dir()
+    if profile_dir:
+        profile_dir = engine_profile_dir(profile_dir, engine)
+        if profile_name:
+            profile_dir = profile_dir / "accounts" / profile_name
+        prepare_profile(profile_dir)
+        context = browser_type(playwright, engine).launch_persistent_context(
+            str(profile_dir), **launch_options(engine), **context_options()
+        )
+        return None, context
+    
+    # 配置了BROWSER_SERVER时连接共享浏览器服务，只需新建上下文；连接失败时在本地启动
+    browser = launch_browser(playwright)
+    context = browser.new_context(**context_options())
+    return browser, context
+
+def get_credentials():
+    """从GT_PW环境变量读取'username password'格式的凭据"""
     try:
         credentials = os.environ.get('GT_PW', '')
         if credentials:
@@ -382,106 +493,541 @@ def run(playwright: Playwright) -> None:
     except ValueError:
         print("错误: GT_PW环境变量设置不正确。格式应为'username password'")
         username, password = "", ""
+    return username, password
+
+def force_check():
+    return os.environ.get(FORCE_CHECK_ENV, "0") == "1"
+
+def skip_not_due(scheduler, urls):
+    """返回已到检查时间的目标，并打印跳过的目标；KEEPALIVE_FORCE_CHECK=1时返回所有目标"""
+    if force_check():
+        return list(urls)
+    now = time.time()
+    due_urls = scheduler.due_targets(urls, now)
+    for url in urls:
+        if url not in due_urls:
+            wait_minutes = (scheduler.target(url)["next_check"] - now) / 60
+            print(f"未到检查时间，跳过 {url}（{wait_minutes:.1f}分钟后检查）")
+    return due_urls
+
+def confirm_running(scheduler, result, url, schedule=True):
+    """健康检查或HTTP探测确认目标正在运行：记为一次运行中的观测，调度器据此学习运行时长"""
+    result["observations"][url] = {"was_running": True, "restarted": False}
+    if schedule:
+        scheduler.record(url, True, False, True)
+
+def record_observations(scheduler, urls, observations, pending_urls):
+    """把keep_alive记录的每个目标的观测结果交给调度器"""
+    for url in urls:
+        observation = observations.get(url, {})
+        if observation.get("was_running") is None:
+            # 没能检查到状态（例如登录失败），按失败处理
+            scheduler.record(url, False, False, False)
+        else:
+            scheduler.record(url, observation["was_running"], observation["restarted"], url not in pending_urls)
+
+class KeepaliveBrowser:
+    """一个浏览器、一个已登录的上下文和每个保活目标各自的页面，可在多轮检查之间复用
+
+    传入browser时在这个共享的浏览器中只创建和关闭自己的上下文（见ContextPool）；
+    state_file、index_file和profile_name区分不同账号的会话快照和用户数据目录
+    """
     
-    # 从环境变量获取URL
-    url = os.environ.get('DEEP_URL', '')
-    if not url:
-        print("警告: DEEP_URL环境变量未设置。登录后将不导航。")
-    
-    # 启动浏览器，添加更多选项以提高稳定性
-    browser = playwright.firefox.launch(
-        headless=True,
-        args=[
-            '--no-sandbox',
-            '--disable-dev-shm-usage',
-            '--disable-gpu',
-            '--disable-web-security'
-        ]
-    )
-    context = browser.new_context(
-        viewport={'width': 1280, 'height': 720},
-        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:91.0) Gecko/20100101 Firefox/91.0'
-    )
-    
-    # 创建新页面
-    page = context.new_page()
-    
-    # 设置默认超时时间
-    page.set_default_timeout(30000)
+    def __init__(self, playwright, username, password, browser=None,
+                 state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE, profile_name=None):
+        self.playwright = playwright
+        self.username = username
+        self.password = password
+        self.shared_browser = browser
+        self.state_file = state_file
+        self.index_file = index_file
+        self.profile_name = profile_name
+        self.browser = None
+        self.context = None
+        self.blocker = None
+        self.page = None
+        self.target_pages = {}
+        self.logged_in = False
+        # HTTP探测已确认保存的会话失效时由run设置，第一次登录跳过cookie登录
+        self.session_invalid = False
+        # 最近一次keep_alive中每个目标的观测结果，供调度器学习
+        self.observations = {}
     
-    try:
-        login_attempts = 0
-        max_login_attempts = 3
-        app_running = False
+    def start(self):
+        if self.shared_browser is not None:
+            with span("context_create"):
+                self.context = self.shared_browser.new_context(**context_options())
+        else:
+            # 启动浏览器（配置了BROWSER_PROFILE_DIR时使用持久化用户数据目录）
+            with span("browser_launch"):
+                self.browser, self.context = launch_context(self.playwright, self.profile_name)
+        
+        # 拦截图片、字体、媒体和第三方追踪请求
+        self.blocker = install_routing(self.context)
+        # 在页面内监听运行状态和Run按钮，状态变化时推送给Python
+        install_watcher(self.context)
+        
+        # 创建新页面（用于登录，同时作为第一个目标的页面）
+        self.page = self.new_page()
+    
+    def new_page(self):
+        page = self.context.new_page()
+        track_network(page)
+        track_status(page)
+        # 设置默认超时时间
+        page.set_default_timeout(clamp_ms(PAGE_TIMEOUT))
+        return page
+    
+    def apply_page_timeouts(self):
+        """按当前的运行预算重新设置所有页面的默认超时；常驻模式每轮检查开始新的预算，复用的页面不会沿用上一轮剩下的几毫秒"""
+        for page in [self.page, *self.target_pages.values()]:
+            if page is not None and not page.is_closed():
+                page.set_default_timeout(clamp_ms(PAGE_TIMEOUT))
+    
+    def session_alive(self):
+        """根据上下文中的登录cookie和各页面的当前地址判断会话是否仍然有效"""
+        try:
+            cookies = self.context.cookies()
+            page_urls = [page.url for page in self.context.pages if not page.is_closed()]
+        except Exception:
+            return False
+        return session_alive(cookies, page_urls)
+    
+    def get_target_page(self, url):
+        """返回目标对应的页面，第一个目标复用登录页面"""
+        target_page = self.target_pages.get(url)
+        if target_page is None or target_page.is_closed():
+            if not self.target_pages and not self.page.is_closed():
+                target_page = self.page
+            else:
+                target_page = self.new_page()
+            self.target_pages[url] = target_page
+        return target_page
+    
+    def keep_alive(self, urls, max_login_attempts=None, reuse_login=False):
+        """登录并确保所有目标运行，返回仍未运行的目标列表
+
+        重试次数和间隔由登录的重试策略决定（max_login_attempts为None时读取RETRY_ATTEMPTS_LOGIN），
+        运行时间预算用完后不再重试；已登录且会话仍然有效时，因应用未运行而进行的重试跳过登录，
+        直接回到目标页面重新检查和点击Run，reuse_login为True时第一次尝试也沿用上一轮的登录状态
+        """
+        pending_urls = list(urls)
+        policy = RetryPolicy("login", attempts=max_login_attempts)
+        self.observations = {url: {"was_running": None, "restarted": False} for url in urls}
         
         # 使用新的登录函数（包含cookie和密码登录）
-        while login_attempts < max_login_attempts and not app_running:
-            login_attempts += 1
-            print(f"登录尝试 {login_attempts}/{max_login_attempts}")
+        for login_attempts in policy.attempts():
+            if not pending_urls:
+                break
+            print(f"登录尝试 {login_attempts}/{policy.max_attempts}")
             
-            if not page or page.is_closed():
-                page = context.new_page()
-                page.set_default_timeout(30000)
+            if not self.page or self.page.is_closed():
+                self.page = self.new_page()
+            self.apply_page_timeouts()
             
-            # 执行登录（先尝试cookie，再尝试密码）
-            login_successful = login_with_cookie_or_password(page, context, username, password)
+            skipped_login = self.logged_in and (reuse_login or login_attempts > 1) and self.session_alive()
+            if skipped_login:
+                print("会话仍然有效，跳过登录直接检查目标")
+                login_successful = True
+            else:
+                # 执行登录（先尝试cookie，再尝试密码）
+                login_successful = login_with_cookie_or_password(
+                    self.page, self.context, self.username, self.password, pending_urls[0] or None,
+                    self.state_file, self.index_file, skip_cookie=self.session_invalid)
+                # 探测结果只对第一次登录有效，之后的会话可能已由密码登录或其他进程更新
+                self.session_invalid = False
+            self.logged_in = login_successful
             
             if login_successful:
-                # 导航到指定URL（如果提供）
-                if url:
-                    try:
-                        print(f"导航到指定的deepnode保活链接: {url}")
-                        page.goto(url, timeout=60000, wait_until="domcontentloaded")
-                        print(f"已导航到指定的deepnode保活链接")
-                        time.sleep(3)
-                    except TimeoutError:
-                        print(f"导航到deepnode保活链接时超时，但继续执行")
-                    except Exception as e:
-                        print(f"导航时出错: {str(e)}")
-                
-                # 检查应用是否正在运行
-                app_running = is_app_running(page)
+                # 登录状态在上下文中共享，依次处理每个尚未运行的目标
+                for url in list(pending_urls):
+                    if expired():
+                        print("运行时间预算已用完，不再检查剩余目标")
+                        break
+                    target_page = self.get_target_page(url)
+                    # 重试或沿用登录状态时页面内容已经过时，重新打开目标；刚登录时登录页面已经导航到了第一个目标
+                    reload = skipped_login or (login_attempts > 1 and target_page is not self.page)
+                    if keep_target_alive(target_page, url, self.observations[url], reload):
+                        print(f"应用已成功运行！{url}")
+                        pending_urls.remove(url)
+                    elif "sign-in" in target_page.url:
+                        # 会话在检查过程中失效，下一次尝试需要重新登录
+                        self.logged_in = False
                 
-                # 如果应用未运行，尝试点击"Run"按钮
-                if not app_running:
-                    click_success = try_click_run_button(page)
-                    
-                    if click_success:
-                        # 检查应用是否正在运行
-                        print(f"等待20s，再次检查是否运行")
-                        time.sleep(20)
-                        app_running = is_app_running(page)
-                
-                if app_running:
-                    print("应用已成功运行！")
+                if not pending_urls or not policy.can_retry(login_attempts):
                     break
                 else:
-                    print(f"应用未运行，将重试。尝试 {login_attempts}/{max_login_attempts}")
-                    time.sleep(5)  # 等待一段时间再重试
-            else:
-                print(f"登录失败，将重试。尝试 {login_attempts}/{max_login_attempts}")
-                time.sleep(10)  # 等待更长时间再重试
+                    print(f"{len(pending_urls)}个应用未运行，将重试。尝试 {login_attempts}/{policy.max_attempts}")
+                    metrics.RETRIES.inc(reason="not_running")
+                    # 按重试策略退避，期间已经启动的应用直接算作成功
+                    policy.wait(login_attempts, lambda: all(running_text_visible(self.get_target_page(url)) for url in pending_urls), self.page)
+                    for url in list(pending_urls):
+                        if running_text_visible(self.get_target_page(url)):
+                            print(f"应用已成功运行！{url}")
+                            pending_urls.remove(url)
+                    if not pending_urls:
+                        break
+            elif not self.password:
+                # 没有配置密码时重试也只会重复失败的cookie登录
+                print("登录失败且未配置密码，不再重试")
+                break
+            elif policy.can_retry(login_attempts):
+                print(f"登录失败，将重试。尝试 {login_attempts}/{policy.max_attempts}")
+                metrics.RETRIES.inc(reason="login")
+                # 按重试策略退避，若期间延迟跳转到了工作区则提前结束等待
+                policy.wait(login_attempts, lambda: "/workspace/" in self.page.url, self.page)
         
-        # 最终检查
-        if app_running:
-            print("脚本执行成功：应用正在运行")
-        else:
-            print(f"脚本执行失败：在{max_login_attempts}次尝试后应用仍未运行")
+        for url in urls:
+            metrics.TARGET_UP.set(0 if url in pending_urls else 1, target=url)
+        return pending_urls
     
-    except Exception as e:
-        print(f"脚本执行过程中出现异常: {str(e)}")
+    def record_schedule(self, scheduler, urls, pending_urls):
+        """把最近一次keep_alive的观测结果交给调度器"""
+        record_observations(scheduler, urls, self.observations, pending_urls)
     
-    finally:
+    def save_state(self):
+        """已登录时保存当前上下文的会话快照，供之后新建的上下文恢复"""
+        if not self.logged_in or self.context is None:
+            return
+        try:
+            save_session(self.context, self.state_file, self.index_file)
+        except Exception as e:
+            print(f"保存会话快照时出错: {str(e)}")
+    
+    def close(self):
+        report_readiness(self.context)
+        if self.blocker:
+            self.blocker.report()
+        if self.shared_browser is None:
+            metrics.update_browser_gauges([self.context], browser_rss())
+        
         # 始终关闭浏览器
         try:
-            if page and not page.is_closed():
-                page.close()
-            context.close()
-            browser.close()
-            print("浏览器已关闭")
+            for target_page in self.target_pages.values():
+                if not target_page.is_closed():
+                    target_page.close()
+            if self.page and not self.page.is_closed():
+                self.page.close()
+            self.context.close()
+            if self.browser:
+                self.browser.close()
+                print("浏览器已关闭")
+            else:
+                print("浏览器上下文已关闭")
         except Exception as e:
             print(f"关闭浏览器时出错: {str(e)}")
+        # 只清理本上下文页面的记录，池中其他账号的页面继续使用已挂上的监听
+        reset_readiness(self.context)
+        reset_status(self.context)
+        reset_watcher(self.context)
+        self.target_pages = {}
+        self.logged_in = False
+
+class ContextPool:
+    """在一个浏览器中为每个账号维护一个独立的上下文（KeepaliveBrowser），按最近使用顺序淘汰
+
+    上下文在第一次用到该账号时创建，之后在多轮检查之间复用；数量超过max_contexts，
+    或浏览器内存超过max_rss（字节，0表示不限制）时淘汰最久未使用的上下文。
+    淘汰前保存会话快照，再次用到时通过login_with_cookie_or_password从快照恢复登录。
+    配置了BROWSER_PROFILE_DIR时各账号使用各自的持久化用户数据目录，不共享浏览器
+    """
+    
+    def __init__(self, playwright, max_contexts=4, max_rss=0):
+        self.playwright = playwright
+        self.max_contexts = max(1, max_contexts)
+        self.max_rss = max_rss
+        self.browser = None
+        self.sessions = OrderedDict()
+    
+    def get(self, account):
+        """返回账号对应的KeepaliveBrowser，并标记为最近使用"""
+        key = account.name or account.username
+        session = self.sessions.pop(key, None)
+        if session is None:
+            while len(self.sessions) >= self.max_contexts:
+                self.evict_oldest()
+            if self.browser is None and get_profile_dir() is None:
+                with span("browser_launch"):
+                    self.browser = launch_browser(self.playwright)
+            session = KeepaliveBrowser(
+                self.playwright, account.username, account.password, browser=self.browser,
+                state_file=account.state_file, index_file=account.index_file,
+                profile_name=account.name or None,
+            )
+            session.start()
+        self.sessions[key] = session
+        return session
+    
+    def evict_oldest(self):
+        key, session = self.sessions.popitem(last=False)
+        print(f"淘汰最久未使用的账号上下文: {session.username}")
+        session.save_state()
+        session.close()
+    
+    def enforce_memory(self):
+        """浏览器内存超过上限时淘汰最久未使用的上下文，至少保留一个"""
+        if not self.max_rss:
+            return
+        while len(self.sessions) > 1:
+            rss = browser_rss()
+            if rss is None or rss <= self.max_rss:
+                break
+            print(f"浏览器内存{rss / 1024 / 1024:.0f}MB超过上下文池上限")
+            self.evict_oldest()
+    
+    def contexts(self):
+        return [session.context for session in self.sessions.values()]
+    
+    def any_page(self):
+        """返回池中任意一个打开的页面，没有时返回None"""
+        for session in self.sessions.values():
+            for page in session.context.pages:
+                if not page.is_closed():
+                    return page
+        return None
+    
+    def close(self):
+        while self.sessions:
+            self.evict_oldest()
+        if self.browser:
+            try:
+                self.browser.close()
+                print("浏览器已关闭")
+            except Exception as e:
+                print(f"关闭浏览器时出错: {str(e)}")
+            self.browser = None
+        reset_readiness()
+        reset_status()
+        reset_watcher()
+
+def run(playwright: Playwright, urls=None, account=None, schedule=True, app_urls=None):
+    """登录一次并在同一个浏览器上下文中保活所有目标链接，每个目标使用一个页面
+
+    未传入account时从GT_PW和DEEP_URL读取账号，从WEB_URL读取应用地址（app_urls）；
+    未到检查时间的目标直接跳过（KEEPALIVE_FORCE_CHECK=1时检查所有目标），应用地址健康的目标不再打开浏览器。
+    schedule为False时不写入调度状态，
+    由调用方根据返回的观测结果统一记录（多进程运行时避免同时写schedule_state.json）。
+    返回{"pending": 仍未运行的目标, "observations": 每个目标的观测结果}
+    """
+    # 所有退出路径（包括不启动浏览器的健康检查和HTTP探测路径）都写入指标文件，避免保留上一次运行的值
+    try:
+        if account is None:
+            # 从环境变量获取凭据
+            username, password = get_credentials()
+        
+            # 从环境变量获取URL
+            if urls is None:
+                urls = get_target_urls('DEEP_URL')
+                if not urls:
+                    print("警告: DEEP_URL环境变量未设置。登录后将不导航。")
+            account = default_account(username, password, urls or [])
+            if app_urls is None:
+                app_urls = get_app_urls('WEB_URL')
+        urls = list(account.urls)
+        # observations只包含本次检查了的目标，未到检查时间而跳过的目标不在其中
+        result = {"pending": [], "observations": {}}
+        session_invalid = False
+        scheduler = AdaptiveScheduler()
+        # 健康检查、HTTP探测和浏览器中的所有重试等待共用一个时间预算
+        start_deadline()
+        if not urls:
+            # 没有保活链接时只在登录页面上检查运行状态
+            urls = ['']
+        else:
+            print(f"共有{len(urls)}个保活目标")
+            
+            # 按各目标学到的运行时长，工作流每次触发时只检查快要闲置关机或上次失败的目标
+            urls = skip_not_due(scheduler, urls)
+            if not urls:
+                print("脚本执行成功：所有目标都未到检查时间，无需启动浏览器")
+                return result
+        
+            # 并发检查各目标对外的应用地址，应用能正常访问的目标无需保活
+            if app_urls:
+                with span("health_check", targets=len(app_urls)):
+                    # 工作流的检查步骤刚检查过时直接使用它的结果（见HEALTH_RESULTS_FILE）
+                    health = load_results(app_urls)
+                    if health is None:
+                        health = check_all(app_urls)
+                    else:
+                        print("使用健康检查步骤保存的结果")
+                report_health(health)
+                healthy_urls = healthy_targets(urls, app_urls, health)
+                for url in healthy_urls:
+                    print(f"健康检查：应用地址正常，跳过 {url}")
+                    metrics.TARGET_UP.set(1, target=url)
+                    confirm_running(scheduler, result, url, schedule)
+                urls = [url for url in urls if url not in healthy_urls]
+                if not urls:
+                    print("脚本执行成功：所有应用地址正常，无需启动浏览器")
+                    return result
+        
+            # 启动浏览器前先用HTTP快速探测，会话有效且应用已在运行的目标无需再打开浏览器
+            with span("http_probe", targets=len(urls)):
+                probe_result = probe(urls, cookie_file=account.state_file)
+            if probe_result["session_valid"]:
+                running_urls = [url for url in urls if probe_result["targets"].get(url)]
+                for url in running_urls:
+                    print(f"HTTP探测：应用正在运行 {url}")
+                    metrics.TARGET_UP.set(1, target=url)
+                    confirm_running(scheduler, result, url, schedule)
+                urls = [url for url in urls if url not in running_urls]
+                if not urls:
+                    print("脚本执行成功：会话有效且所有应用正在运行，无需启动浏览器")
+                    return result
+            elif probe_result["session_valid"] is False:
+                print("HTTP探测：保存的会话已失效，将直接使用密码登录")
+                session_invalid = True
+    
+        keepalive = KeepaliveBrowser(
+            playwright, account.username, account.password,
+            state_file=account.state_file, index_file=account.index_file, profile_name=account.name or None,
+        )
+        keepalive.session_invalid = session_invalid
+        run_span = start_span("run", targets=len(urls))
+        try:
+            keepalive.start()
+        except BaseException as e:
+            # 浏览器没能启动时也要结束阶段，否则当前阶段一直停留在run上
+            end_span(run_span, error=e)
+            raise
+        pending_urls = urls
+    
+        try:
+            pending_urls = keepalive.keep_alive(urls)
+            if schedule:
+                keepalive.record_schedule(scheduler, [url for url in urls if url], pending_urls)
+        
+            # 最终检查
+            if not pending_urls:
+                print("脚本执行成功：应用正在运行")
+            else:
+                print(f"脚本执行失败：重试后仍有{len(pending_urls)}个应用未运行")
+                for url in pending_urls:
+                    print(f"未运行: {url}")
+    
+        except Exception as e:
+            print(f"脚本执行过程中出现异常: {str(e)}")
+    
+        finally:
+            keepalive.close()
+            reset_readiness()
+            reset_status()
+            reset_watcher()
+            end_span(run_span, pending=len(pending_urls))
+    
+        result["pending"] = list(pending_urls)
+        result["observations"].update({url: keepalive.observations.get(url, {}) for url in urls if url})
+        return result
+    finally:
+        metrics.write_textfile()
+
+def get_int_env(name, default):
+    """读取整数环境变量，设置不正确时使用默认值"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        print(f"错误: {name}环境变量设置不正确，使用默认值{default}")
+        return default
+
+def run_daemon(playwright: Playwright, urls=None, accounts=None) -> None:
+    """常驻模式：复用同一个浏览器和每个账号的上下文，按自适应调度检查各个目标
+
+    DAEMON_INTERVAL：没有观测数据时的检查间隔（秒）；DAEMON_RECYCLE_CYCLES：运行多少轮后重启浏览器；
+    DAEMON_MAX_RSS_MB：浏览器进程内存超过该值（MB）后重启浏览器；
+    DAEMON_IDLE_CLOSE：距离下次检查超过该秒数时先关闭浏览器；
+    CONTEXT_POOL_SIZE：最多同时保留的账号上下文数；CONTEXT_POOL_MAX_RSS_MB：浏览器内存超过该值（MB）时淘汰最久未使用的上下文；
+    KEEPALIVE_METRICS_PORT：在该端口提供/metrics
+    """
+    if accounts is None:
+        username, password = get_credentials()
+        accounts = [default_account(username, password, urls if urls is not None else get_target_urls('DEEP_URL'))]
+    urls = [url for account in accounts for url in account.urls]
+    if not urls:
+        print("错误: 常驻模式需要设置DEEP_URL环境变量")
+        return
+    
+    interval = get_int_env('DAEMON_INTERVAL', 300)
+    recycle_cycles = get_int_env('DAEMON_RECYCLE_CYCLES', 50)
+    max_rss = get_int_env('DAEMON_MAX_RSS_MB', 1024) * 1024 * 1024
+    idle_close = get_int_env('DAEMON_IDLE_CLOSE', 900)
+    pool_size = get_int_env('CONTEXT_POOL_SIZE', 4)
+    pool_max_rss = get_int_env('CONTEXT_POOL_MAX_RSS_MB', 768) * 1024 * 1024
+    scheduler = AdaptiveScheduler(default_interval=interval)
+    print(f"常驻模式：{len(accounts)}个账号、{len(urls)}个目标，默认每{interval}秒检查一次，"
+          f"每{recycle_cycles}轮或内存超过{max_rss // 1024 // 1024}MB时重启浏览器")
+    
+    metrics_server = metrics.start_metrics_server()
+    pool = None
+    cycles = 0
+    try:
+        while True:
+            due_urls = scheduler.due_targets(urls)
+            if due_urls:
+                if pool is None:
+                    pool = ContextPool(playwright, pool_size, pool_max_rss)
+                    cycles = 0
+                
+                cycle_started = time.monotonic()
+                # 每轮检查有自己的时间预算
+                start_deadline()
+                recycle = False
+                for account in accounts:
+                    account_urls = [url for url in due_urls if url in account.urls]
+                    if not account_urls:
+                        continue
+                    try:
+                        keepalive = pool.get(account)
+                        pending_urls = keepalive.keep_alive(account_urls, reuse_login=True)
+                        keepalive.record_schedule(scheduler, account_urls, pending_urls)
+                        if pending_urls:
+                            print(f"本轮检查后{account.username}仍有{len(pending_urls)}个应用未运行")
+                    except Exception as e:
+                        print(f"本轮检查出现异常，将重启浏览器: {str(e)}")
+                        for url in account_urls:
+                            scheduler.record(url, False, False, False)
+                        recycle = True
+                        break
+                    pool.enforce_memory()
+                cycles += 1
+                print(f"第{cycles}轮检查{len(due_urls)}个目标，耗时{time.monotonic() - cycle_started:.1f}秒")
+                
+                rss = browser_rss()
+                metrics.update_browser_gauges(pool.contexts(), rss)
+                if rss is not None and rss > max_rss:
+                    print(f"浏览器内存{rss / 1024 / 1024:.0f}MB超过上限，重启浏览器")
+                    recycle = True
+                elif cycles >= recycle_cycles:
+                    print(f"已运行{cycles}轮，重启浏览器")
+                    recycle = True
+                if recycle:
+                    pool.close()
+                    pool = None
+                metrics.write_textfile()
+            
+            sleep_seconds = scheduler.seconds_until_next(urls)
+            if pool is not None and sleep_seconds > idle_close:
+                # 下次检查还早，先关闭浏览器释放内存
+                print(f"距离下次检查{sleep_seconds / 60:.1f}分钟，先关闭浏览器")
+                pool.close()
+                pool = None
+                metrics.update_browser_gauges([], browser_rss())
+                metrics.write_textfile()
+            # 浏览器仍然打开时通过页面等待，期间继续处理路由拦截和页面自己的请求
+            pause(max(1, sleep_seconds), pool.any_page() if pool else None)
+    except KeyboardInterrupt:
+        print("收到中断信号，退出常驻模式")
+    finally:
+        if pool:
+            pool.close()
+        metrics.write_textfile()
+        if metrics_server:
+            metrics_server.shutdown()
 
 if __name__ == "__main__":
     with sync_playwright() as playwright:
-        run(playwright)
+        # python main.py daemon 以常驻模式运行
+        if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+            run_daemon(playwright)
+        else:
+            run(playwright)
@@ -0,0 +1,657 @@
+import os
+import time
+import asyncio
+from playwright.async_api import Playwright, async_playwright, TimeoutError
+from locators import (
+    GITHUB_BUTTON_STRATEGIES, USERNAME_FIELD_STRATEGIES, PASSWORD_FIELD_STRATEGIES,
+    SIGN_IN_BUTTON_STRATEGIES, RUN_BUTTON_STRATEGIES, race_locators_async, any_locator,
+)
+from readiness import track_network, wait_ready_async, report_readiness
+from network_status import track_status_async
+from dom_watcher import install_watcher_async, watching, wait_for_dom_async, reset_watcher
+from http_probe import probe
+from health_check import get_app_urls, check_all, load_results, healthy_targets, report as report_health
+from routing import install_routing_async
+from browser_profile import get_profile_dir, prepare_profile, record_navigation
+from browser_engine import get_engine, browser_type, launch_options, context_options, engine_profile_dir
+from browser_server import connect_browser_async
+from session_store import (
+    STORAGE_STATE_FILE, SESSION_INDEX_FILE, load_session, session_status, local_storage_script,
+    SessionLock, session_lock_timeout, session_version, refreshed_session,
+    save_session_async, session_alive,
+)
+from telemetry import span, traced
+from process_stats import browser_rss
+import metrics
+from waits import wait_until_async
+from retry_policy import RetryPolicy, start_deadline, clamp, clamp_ms
+from main import RUN_START_TIMEOUT, PAGE_READY_TIMEOUT, PAGE_TIMEOUT
+from main import get_target_urls, deepnote_url, is_deepnote_url, is_workspace_url
+
+# 默认同时处理的保活目标数量，可通过KEEPALIVE_CONCURRENCY环境变量调整
+DEFAULT_CONCURRENCY = 5
+
+async def adopt_session(page, context, state, target_url=None):
+    """使用其他进程刚保存的会话，验证通过返回True"""
+    try:
+        await context.add_cookies(state["cookies"])
+        if state.get("origins"):
+            await context.add_init_script(local_storage_script(state))
+        if target_url:
+            await page.goto(target_url, timeout=clamp_ms(30000), wait_until="domcontentloaded")
+            return "sign-in" not in page.url
+        await page.goto(deepnote_url("/sign-in"), timeout=clamp_ms(30000), wait_until="domcontentloaded")
+        await page.wait_for_url("**/workspace/**", timeout=clamp_ms(8000))
+        return True
+    except Exception as e:
+        print(f"使用新会话时出错: {str(e)}")
+        return False
+
+async def password_login(page, context, username, password, state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE):
+    """执行密码登录流程并保存会话快照，无法打开登录页面时返回False"""
+    with span("login.password"):
+        print("执行密码登录流程")
+    
+        # 导航到DeepNote登录页面，使用重试机制
+        if page.url != deepnote_url("/sign-in"):
+            try:
+                await RetryPolicy("navigate").call_async(
+                    lambda: page.goto(deepnote_url("/sign-in"), timeout=clamp_ms(15000), wait_until="domcontentloaded"),
+                    retry_on=(TimeoutError,), label="密码登录导航")
+                print("已导航到DeepNote登录页面")
+            except TimeoutError:
+                print("多次导航尝试失败")
+                return False
+        
+            # 等待登录选项出现，代替等待网络空闲
+            if not await wait_ready_async(page, "登录页面", locator=any_locator(page, GITHUB_BUTTON_STRATEGIES), timeout=clamp_ms(20000)):
+                print("等待登录选项出现超时，但继续执行")
+    
+        # 登录选项无需固定等待，下面的按钮查找一旦按钮出现就会立即返回
+    
+        # 同时等待所有方法找到GitHub登录按钮
+        github_clicked = False
+        try:
+            index, github_button = await race_locators_async(page, GITHUB_BUTTON_STRATEGIES, timeout=clamp_ms(8000), name="github_button")
+            if github_button:
+                await github_button.click()
+                github_clicked = True
+                print(f"点击GitHub登录按钮（方法{index + 1}）")
+            else:
+                print("无法找到GitHub登录按钮")
+        except Exception as e:
+            print(f"点击GitHub登录按钮时出错: {str(e)}")
+    
+        if not github_clicked:
+            print("未找到GitHub登录按钮，尝试直接输入凭据")
+    
+        # 等待GitHub登录表单出现，代替等待网络空闲
+        if not await wait_ready_async(page, "GitHub登录表单", locator=any_locator(page, USERNAME_FIELD_STRATEGIES), timeout=clamp_ms(20000)):
+            print("等待GitHub登录表单超时，但继续执行")
+    
+        # 等待用户名字段并输入凭据（输入框出现即结束等待）
+        try:
+            # 同时尝试多种方式定位用户名输入框
+            username_filled = False
+            index, username_field = await race_locators_async(page, USERNAME_FIELD_STRATEGIES, timeout=clamp_ms(8000), name="username_field")
+            if username_field:
+                await username_field.click()
+                await username_field.fill(username)
+                username_filled = True
+                print(f"已输入用户名（方法{index + 1}）")
+            else:
+                print("未找到用户名字段")
+        except Exception as e:
+            print(f"输入用户名时出错: {str(e)}")
+    
+        # 等待密码字段并输入凭据
+        try:
+            # 同时尝试多种方式定位密码输入框
+            password_filled = False
+            index, password_field = await race_locators_async(page, PASSWORD_FIELD_STRATEGIES, timeout=clamp_ms(8000), name="password_field")
+            if password_field:
+                await password_field.click()
+                await password_field.fill(password)
+                password_filled = True
+                print(f"已输入密码（方法{index + 1}）")
+            else:
+                print("未找到密码字段")
+        except Exception as e:
+            print(f"输入密码时出错: {str(e)}")
+    
+        # 点击登录按钮
+        login_clicked = False
+        try:
+            # 同时尝试多种方式定位登录按钮
+            index, sign_in_button = await race_locators_async(page, SIGN_IN_BUTTON_STRATEGIES, timeout=clamp_ms(8000), name="sign_in_button")
+            if sign_in_button:
+                await sign_in_button.click()
+                login_clicked = True
+                print(f"已点击登录按钮（方法{index + 1}）")
+            else:
+                print("未找到登录按钮")
+        except Exception as e:
+            print(f"点击登录按钮时出错: {str(e)}")
+    
+        if login_clicked:
+            # 等待登录后跳转回DeepNote，代替等待网络空闲
+            if await wait_ready_async(page, "登录后跳转", url=lambda u: is_deepnote_url(u) and "sign-in" not in u, timeout=clamp_ms(20000)):
+                print("登录完成，已跳转回DeepNote")
+            
+                # 保存成功登录后的会话快照（cookies和localStorage）
+                try:
+                    await save_session_async(context, state_file, index_file)
+                    print("已将会话快照保存到文件")
+                except Exception as e:
+                    print(f"保存会话快照时出错: {str(e)}")
+            else:
+                print("登录后页面跳转超时，但继续执行")
+    return True
+
+@traced("login")
+async def login_with_cookie_or_password(page, context, username, password, target_url=None,
+                                 state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE, skip_cookie=False):
+    """先尝试用保存的会话登录，失败后执行密码登录流程
+
+    会话快照按cookie过期时间索引：已过期时直接进行密码登录；
+    未过期且提供了target_url时直接打开保活链接验证，不再经过登录页面；
+    state_file和index_file为该账号的会话快照文件（见session_store.account_session_files）；
+    skip_cookie为True时（HTTP探测已确认保存的会话失效）不再尝试cookie登录，直接进行密码登录
+    """
+    cookie_login_successful = False
+    version = session_version(state_file)
+    state = load_session(state_file)
+    status = "invalid" if skip_cookie else session_status(state, index_file)
+    
+    # 先尝试使用保存的会话登录
+    with span("login.cookie", session=status) as cookie_attrs:
+        if status == "missing":
+            print("未找到保存的会话，将使用密码登录")
+        elif status == "expired":
+            print("保存的登录cookie已过期，跳过cookie登录")
+        elif status == "invalid":
+            print("HTTP探测已确认保存的会话失效，跳过cookie登录")
+        else:
+            if status == "unknown":
+                print("保存的会话中没有可识别的登录cookie，无法按过期时间判断，尝试直接使用")
+            try:
+                print("尝试使用保存的会话登录")
+                await context.add_cookies(state["cookies"])
+                if state.get("origins"):
+                    await context.add_init_script(local_storage_script(state))
+                print("已加载cookies和localStorage")
+            
+                if target_url:
+                    # 直接打开保活链接，没有被重定向到登录页面即说明会话有效
+                    try:
+                        print("直接导航到保活链接验证会话")
+                        navigation_started = time.monotonic()
+                        with span("navigate", url=target_url):
+                            await page.goto(target_url, timeout=clamp_ms(30000), wait_until="domcontentloaded")
+                        if "sign-in" not in page.url:
+                            print("会话有效，已进入保活链接")
+                            cookie_login_successful = True
+                            await record_page_ready(page, navigation_started)
+                        else:
+                            print("会话无效，已被重定向到登录页面")
+                    except TimeoutError:
+                        print("导航到保活链接超时，cookie登录失败")
+                else:
+                    # 通过导航到登录页面测试cookies是否有效
+                    if page.url != deepnote_url("/sign-in"):
+                        try:
+                            # 超时按导航的重试策略重试，每次的超时不超过运行的剩余预算
+                            await RetryPolicy("navigate").call_async(
+                                lambda: page.goto(deepnote_url("/sign-in"), timeout=clamp_ms(30000), wait_until="domcontentloaded"),
+                                retry_on=(TimeoutError,), label="Cookie登录导航")
+                            print("已导航到DeepNote登录页面")
+                        except TimeoutError:
+                            print("多次尝试导航失败，cookie登录失败")
+                            return False
+                
+                    # 等待看是否重定向到工作区
+                    try:
+                        await page.wait_for_url("**/workspace/**", timeout=clamp_ms(8000))
+                        current_url = page.url
+                        if is_workspace_url(current_url):
+                            print("Cookie登录成功，导航到工作区")
+                            cookie_login_successful = True
+                        else:
+                            print("Cookie登录可能失败，URL不匹配工作区模式")
+                    except TimeoutError:
+                        print("Cookie登录失败，URL未变更为工作区")
+            except Exception as e:
+                print(f"加载或使用cookies时出错: {str(e)}")
+        cookie_attrs["success"] = cookie_login_successful
+    
+    # 如果cookie登录失败，执行密码登录；同一账号同时只有一个进程执行密码登录（见session_store.SessionLock），
+    # 等待期间其他进程保存了新会话时直接使用它
+    if not cookie_login_successful:
+        async with SessionLock(state_file, timeout=clamp(session_lock_timeout())):
+            fresh_state = refreshed_session(version, state_file, index_file)
+            if fresh_state and await adopt_session(page, context, fresh_state, target_url):
+                print("已使用其他进程刚保存的会话")
+            elif not await password_login(page, context, username, password, state_file, index_file):
+                return False
+    
+    # 检查最终登录状态
+    login_successful = False
+    with span("login.verify"):
+        try:
+            await page.wait_for_url("**/workspace/**", timeout=clamp_ms(10000))
+            current_url = page.url
+            if is_workspace_url(current_url):
+                print("登录成功，导航到工作区")
+                login_successful = True
+            else:
+                print("登录可能失败，未导航到工作区")
+        except TimeoutError:
+            print("登录可能失败，未导航到工作区")
+            # 尝试检查当前URL是否包含登录成功的迹象
+            current_url = page.url
+            if is_deepnote_url(current_url) and "sign-in" not in current_url:
+                print("可能已登录成功（基于URL判断）")
+                login_successful = True
+    
+    return login_successful
+
+async def running_text_visible(page):
+    """立即检查页面上是否可见"Running"文本，不等待"""
+    try:
+        return await page.locator("text=/Running/").filter(visible=True).first.is_visible()
+    except Exception:
+        return False
+
+async def app_ui_visible(page):
+    """立即检查页面上是否已渲染出运行状态或Run按钮，不等待"""
+    try:
+        combined = any_locator(page, RUN_BUTTON_STRATEGIES)
+        return await running_text_visible(page) or await combined.filter(visible=True).first.is_visible()
+    except Exception:
+        return False
+
+async def record_page_ready(page, started):
+    """record_page_ready的async版本"""
+    ready = await wait_until_async(lambda: app_ui_visible(page), clamp(PAGE_READY_TIMEOUT))
+    if not ready:
+        print(f"页面在{PAGE_READY_TIMEOUT}秒内没有渲染出运行状态或Run按钮，按超时记录导航耗时")
+    record_navigation(time.monotonic() - started)
+    return ready
+
+@traced("post_click_wait")
+async def wait_until_running(page, timeout=RUN_START_TIMEOUT):
+    """等待网页收到运行状态或出现"Running"文本，出现即返回True，超过timeout秒（不超过运行的剩余预算）返回False"""
+    timeout = clamp(timeout)
+    started = time.monotonic()
+    network_status = track_status_async(page)
+    
+    # 页面在"Running"出现时通过绑定推送，网页请求带回运行状态时也立即结束等待
+    state = await wait_for_dom_async(page, "running", timeout * 1000, network_status) if watching(page) else False
+    if state is not False:
+        running = bool(state)
+    else:
+        async def running_signal():
+            return network_status.current() is True or await running_text_visible(page)
+        running = await wait_until_async(running_signal, timeout)
+    if running:
+        print(f"应用在{time.monotonic() - started:.1f}秒后进入运行状态")
+    else:
+        print(f"等待{timeout}秒后仍未看到'Running'文本")
+    return running
+
+@traced("status_check")
+async def is_app_running(page):
+    """检查应用是否正在运行，优先使用网页收到的机器状态，没有收到时回退到检查"Running"文本"""
+    network_status = track_status_async(page)
+    running = await network_status.wait_async(page)
+    if running is not None:
+        print(f"应用状态检查（网络）：{'运行中' if running else '未运行'}，来源{network_status.source}")
+        return running
+    
+    if watching(page):
+        # 在页面内等待运行状态或Run按钮出现；只出现了按钮时再给"Running"文本最多3秒
+        state = await wait_for_dom_async(page, "status", clamp_ms(10000))
+        if state is not False:
+            if state and not state["running"]:
+                state = await wait_for_dom_async(page, "running", clamp_ms(3000))
+            running = bool(state and state["running"])
+            print(f"应用状态检查（页面监听）：{'运行中' if running else '未运行'}")
+            return running
+    
+    try:
+        # 等待运行状态或Run按钮渲染出来，代替等待网络空闲
+        status_locator = page.locator("text=/Running/").or_(
+            any_locator(page, RUN_BUTTON_STRATEGIES))
+        if not await wait_ready_async(page, "应用状态", locator=status_locator, timeout=clamp_ms(10000)):
+            print("等待应用状态出现超时，但继续检查")
+        
+        # 条件1：检查是否存在"Running"文本（必须大写R开头）
+        running_text_found = False
+        try:
+            # 使用精确匹配大写开头的"Running"文本
+            running_text_elements = page.locator("text=/Running/").filter(visible=True)
+            await running_text_elements.first.wait_for(state="visible", timeout=clamp_ms(3000))
+            found_text = await running_text_elements.first.text_content()
+            print(f"找到运行状态文本: '{found_text}'")
+            
+            # 验证找到的文本确实是大写R开头的"Running"
+            if found_text and "Running" in found_text:
+                running_text_found = True
+                print("找到'Running'文本")
+            else:
+                print("未找到'Running'文本")
+        except TimeoutError:
+            print("未找到'Running'文本")
+        
+        is_running = running_text_found
+        if is_running:
+            print("应用状态检查：运行中")
+        else:
+            print(f"应用状态检查：未运行")
+        
+        return is_running
+        
+    except Exception as e:
+        print(f"应用状态检查出错，假设未运行: {str(e)}")
+        return False
+
+@traced("run_click")
+async def try_click_run_button(page):
+    """尝试点击Run按钮"""
+    try:
+        # 等待Run按钮出现，代替等待网络空闲；安装了页面监听时由页面在按钮出现时通知
+        state = await wait_for_dom_async(page, "run_button", clamp_ms(20000)) if watching(page) else False
+        if state is False:
+            if not await wait_ready_async(page, "Run按钮", locator=any_locator(page, RUN_BUTTON_STRATEGIES), timeout=clamp_ms(20000)):
+                print("等待Run按钮出现超时，但继续执行")
+        elif state is None:
+            print("等待Run按钮出现超时，但继续执行")
+        
+        # 同时尝试多种方式定位Run按钮
+        run_button_found = False
+        index, run_button = await race_locators_async(page, RUN_BUTTON_STRATEGIES, timeout=clamp_ms(8000), name="run_button")
+        if run_button:
+            await run_button.click()
+            run_button_found = True
+            print(f"点击了'Run'按钮（方法{index + 1}）")
+        else:
+            print("尝试了多种方法但未找到'Run'按钮")
+        
+        return run_button_found
+    except Exception as e:
+        print(f"尝试点击'Run'按钮时出错: {str(e)}")
+        return False
+
+@traced("target")
+async def keep_target_alive(context, url, semaphore, page=None, session=None, reload=False):
+    """在独立页面上导航到保活链接并确保应用运行，返回应用是否正在运行
+    
+    传入page时直接使用该页面且不负责关闭，否则为目标新建页面；页面已经在该链接上（登录时打开）时不再重复导航，
+    reload为True时仍然重新导航（跳过登录的重试中页面内容已经过时）；
+    传入session字典时，页面被重定向到登录页面会把session["valid"]置为False
+    """
+    async with semaphore:
+        owns_page = page is None
+        if owns_page:
+            page = await context.new_page()
+            track_network(page)
+            track_status_async(page)
+            page.set_default_timeout(clamp_ms(PAGE_TIMEOUT))
+        try:
+            # 导航到指定URL（如果提供，登录时已经打开该链接则不再重复导航）
+            if url and (page.url != url or reload):
+                try:
+                    print(f"导航到指定的deepnode保活链接: {url}")
+                    navigation_started = time.monotonic()
+                    with span("navigate", url=url):
+                        await page.goto(url, timeout=clamp_ms(60000), wait_until="domcontentloaded")
+                    print(f"已导航到指定的deepnode保活链接")
+                    await record_page_ready(page, navigation_started)
+                except TimeoutError:
+                    print(f"导航到deepnode保活链接时超时，但继续执行")
+                except Exception as e:
+                    print(f"导航时出错: {str(e)}")
+            
+            # 检查应用是否正在运行
+            app_running = await is_app_running(page)
+            
+            # 如果应用未运行，尝试点击"Run"按钮
+            if not app_running:
+                click_success = await try_click_run_button(page)
+                
+                if click_success:
+                    # 等待"Running"出现后再完整检查一次，最多等待RUN_START_TIMEOUT秒
+                    print(f"等待应用启动，最多{RUN_START_TIMEOUT}秒")
+                    if await wait_until_running(page):
+                        app_running = await is_app_running(page)
+            
+            return app_running
+        except Exception as e:
+            print(f"保活{url}时出错: {str(e)}")
+            return False
+        finally:
+            if session is not None and "sign-in" in page.url:
+                session["valid"] = False
+            if owns_page and not page.is_closed():
+                await page.close()
+
+def get_concurrency():
+    """从KEEPALIVE_CONCURRENCY环境变量读取并发数，设置不正确时使用默认值"""
+    try:
+        concurrency = int(os.environ.get('KEEPALIVE_CONCURRENCY', DEFAULT_CONCURRENCY))
+    except ValueError:
+        print(f"错误: KEEPALIVE_CONCURRENCY环境变量设置不正确，使用默认值{DEFAULT_CONCURRENCY}")
+        return DEFAULT_CONCURRENCY
+    return max(1, concurrency)
+
+async def launch_context(playwright):
+    """启动浏览器并创建上下文，返回(browser, context)
+
+    浏览器引擎由BROWSER_ENGINE选择（见browser_engine.py）；
+    配置了BROWSER_PROFILE_DIR时使用launch_persistent_context复用用户数据目录，
+    此时browser为None，关闭context即关闭浏览器；
+    连接共享浏览器服务时关闭browser只会断开连接，不会关闭服务中的浏览器
+    """
+    engine = get_engine()
+    browser_kind = browser_type(playwright, engine)
+    profile_dir = get_profile_dir()
+    if profile_dir:
+        profile_dir = engine_profile_dir(profile_dir, engine)
+        prepare_profile(profile_dir)
+        context = await browser_kind.launch_persistent_context(
+            str(profile_dir), **launch_options(engine), **context_options()
+        )
+        return None, context
+    
+    # 配置了BROWSER_SERVER时连接共享浏览器服务，只需新建上下文；连接失败时在本地启动
+    browser = await connect_browser_async(playwright)
+    if browser is None:
+        # 按BROWSER_ENGINE启动浏览器，只传入该引擎支持的参数
+        browser = await browser_kind.launch(**launch_options(engine))
+    context = await browser.new_context(**context_options())
+    return browser, context
+
+async def run(playwright: Playwright, urls=None, concurrency=None, app_urls=None) -> None:
+    """登录一次后并发检查和启动所有目标，最多同时处理concurrency个目标
+
+    app_urls为None时从WEB_URL读取应用地址，应用地址健康的目标不再打开浏览器（与main.run相同）
+    """
+    # 从环境变量获取凭据
+    try:
+        credentials = os.environ.get('GT_PW', '')
+        if credentials:
+            username, password = credentials.split(' ', 1)
+        else:
+            print("警告: GT_PW环境变量未设置")
+            username, password = "", ""
+    except ValueError:
+        print("错误: GT_PW环境变量设置不正确。格式应为'username password'")
+        username, password = "", ""
+    
+    # 从环境变量获取URL
+    if urls is None:
+        urls = get_target_urls('DEEP_URL')
+        if not urls:
+            print("警告: DEEP_URL环境变量未设置。登录后将不导航。")
+    if app_urls is None:
+        app_urls = get_app_urls('WEB_URL')
+    # 健康检查、HTTP探测和浏览器中的所有重试等待共用一个时间预算
+    start_deadline()
+    session_invalid = False
+    if not urls:
+        urls = ['']
+    else:
+        print(f"共有{len(urls)}个保活目标")
+        
+        # 并发检查各目标对外的应用地址，应用能正常访问的目标无需保活；健康检查只用标准库，在线程中运行
+        if app_urls:
+            with span("health_check", targets=len(app_urls)):
+                health = load_results(app_urls)
+                if health is None:
+                    health = await asyncio.to_thread(check_all, app_urls)
+                else:
+                    print("使用健康检查步骤保存的结果")
+            report_health(health)
+            healthy_urls = healthy_targets(urls, app_urls, health)
+            for url in healthy_urls:
+                print(f"健康检查：应用地址正常，跳过 {url}")
+                metrics.TARGET_UP.set(1, target=url)
+            urls = [url for url in urls if url not in healthy_urls]
+            if not urls:
+                print("脚本执行成功：所有应用地址正常，无需启动浏览器")
+                metrics.write_textfile()
+                return
+        
+        # 启动浏览器前先用HTTP快速探测，会话有效且应用已在运行的目标无需再打开浏览器
+        with span("http_probe", targets=len(urls)):
+            probe_result = probe(urls)
+        if probe_result["session_valid"]:
+            running_urls = [url for url in urls if probe_result["targets"].get(url)]
+            for url in running_urls:
+                print(f"HTTP探测：应用正在运行 {url}")
+                metrics.TARGET_UP.set(1, target=url)
+            urls = [url for url in urls if url not in running_urls]
+            if not urls:
+                print("脚本执行成功：会话有效且所有应用正在运行，无需启动浏览器")
+                # 不启动浏览器时同样写入指标文件，避免保留上一次运行的值
+                metrics.write_textfile()
+                return
+        elif probe_result["session_valid"] is False:
+            print("HTTP探测：保存的会话已失效，将直接使用密码登录")
+            session_invalid = True
+    
+    if concurrency is None:
+        concurrency = get_concurrency()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    # 启动浏览器（配置了BROWSER_PROFILE_DIR时使用持久化用户数据目录）
+    with span("browser_launch"):
+        browser, context = await launch_context(playwright)
+    
+    # 拦截图片、字体、媒体和第三方追踪请求
+    blocker = await install_routing_async(context)
+    # 在页面内监听运行状态和Run按钮，状态变化时推送给Python
+    await install_watcher_async(context)
+    
+    # 创建登录页面
+    page = await context.new_page()
+    track_network(page)
+    track_status_async(page)
+    
+    pending_urls = list(urls)
+    
+    try:
+        policy = RetryPolicy("login")
+        # 登录成功后记录会话是否仍然有效，因应用未运行而重试时据此跳过登录
+        session = {"valid": False}
+        
+        for login_attempts in policy.attempts():
+            if not pending_urls:
+                break
+            print(f"登录尝试 {login_attempts}/{policy.max_attempts}")
+            
+            if not page or page.is_closed():
+                page = await context.new_page()
+                track_network(page)
+                track_status_async(page)
+            # 每次尝试按剩余预算重新设置默认超时，不沿用创建页面时的值
+            page.set_default_timeout(clamp_ms(PAGE_TIMEOUT))
+            
+            skipped_login = session["valid"] and session_alive(await context.cookies(), [page.url])
+            if skipped_login:
+                print("会话仍然有效，跳过登录直接检查目标")
+                login_successful = True
+            else:
+                # 执行登录（先尝试cookie，再尝试密码）
+                login_successful = await login_with_cookie_or_password(
+                    page, context, username, password, pending_urls[0] or None, skip_cookie=session_invalid)
+                # 探测结果只对第一次登录有效，之后的会话可能已由密码登录或其他进程更新
+                session_invalid = False
+            session["valid"] = login_successful
+            
+            if login_successful:
+                # 登录状态在上下文中共享，并发处理所有尚未运行的目标；登录页面已经打开了第一个目标，直接复用
+                results = await asyncio.gather(
+                    *(keep_target_alive(context, url, semaphore, page if index == 0 else None, session,
+                                        reload=skipped_login and index == 0)
+                      for index, url in enumerate(pending_urls))
+                )
+                for url, app_running in zip(list(pending_urls), results):
+                    if app_running:
+                        print(f"应用已成功运行！{url}")
+                        pending_urls.remove(url)
+                
+                if not pending_urls or not policy.can_retry(login_attempts):
+                    break
+                else:
+                    print(f"{len(pending_urls)}个应用未运行，将重试。尝试 {login_attempts}/{policy.max_attempts}")
+                    metrics.RETRIES.inc(reason="not_running")
+                    await policy.wait_async(login_attempts)
+            elif not password:
+                # 没有配置密码时重试也只会重复失败的cookie登录
+                print("登录失败且未配置密码，不再重试")
+                break
+            elif policy.can_retry(login_attempts):
+                print(f"登录失败，将重试。尝试 {login_attempts}/{policy.max_attempts}")
+                metrics.RETRIES.inc(reason="login")
+                # 按重试策略退避，若期间延迟跳转到了工作区则提前结束等待
+                async def reached_workspace():
+                    return "/workspace/" in page.url
+                await policy.wait_async(login_attempts, reached_workspace)
+        
+        # 最终检查
+        if not pending_urls:
+            print("脚本执行成功：应用正在运行")
+        else:
+            print(f"脚本执行失败：重试后仍有{len(pending_urls)}个应用未运行")
+            for url in pending_urls:
+                print(f"未运行: {url}")
+    
+    except Exception as e:
+        print(f"脚本执行过程中出现异常: {str(e)}")
+    
+    finally:
+        report_readiness()
+        if blocker:
+            blocker.report()
+        metrics.update_browser_gauges([context], browser_rss())
+        reset_watcher(context)
+        
+        # 始终关闭浏览器
+        try:
+            if page and not page.is_closed():
+                await page.close()
+            await context.close()
+            if browser:
+                await browser.close()
+            print("浏览器已关闭")
+        except Exception as e:
+            print(f"关闭浏览器时出错: {str(e)}")
+        metrics.write_textfile()
+
+async def main():
+    async with async_playwright() as playwright:
+        await run(playwright)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,239 @@
+import os
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from telemetry import add_span_listener
+
+# 指标以textfile collector格式写入该文件（例如node_exporter的textfile目录下的keepalive.prom），为空时不写入
+METRICS_FILE_ENV = "KEEPALIVE_METRICS_FILE"
+# 常驻模式下在该端口提供/metrics，为空时不启动
+METRICS_PORT_ENV = "KEEPALIVE_METRICS_PORT"
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# 登录、导航和等待Running的耗时分布（秒）
+DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """一个指标族，按标签值分别记录"""
+
+    type_name = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.label_names)
+
+    def samples(self, openmetrics):
+        raise NotImplementedError
+
+    def snapshot(self):
+        with self.lock:
+            return {key: self.copy_value(value) for key, value in self.values.items()}
+
+    def copy_value(self, value):
+        return value
+
+    def merge(self, values):
+        """把另一个进程的snapshot累加到本进程"""
+        with self.lock:
+            for key, value in values.items():
+                self.values[key] = self.add_values(self.values.get(key), value)
+
+    def add_values(self, current, value):
+        return value if current is None else current + value
+
+    def render(self, openmetrics=True):
+        # OpenMetrics中计数器族名不带_total，Prometheus文本格式中带
+        family = self.name if openmetrics or self.type_name != "counter" else self.name + "_total"
+        lines = [f"# TYPE {family} {self.type_name}", f"# HELP {family} {self.help_text}"]
+        with self.lock:
+            lines += [f"{name}{format_labels(labels)} {format_value(value)}"
+                      for name, labels, value in self.samples(openmetrics)]
+        return lines
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self, openmetrics):
+        return [(self.name + "_total", key, value) for key, value in sorted(self.values.items())]
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def samples(self, openmetrics):
+        return [(self.name, key, value) for key, value in sorted(self.values.items())]
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def copy_value(self, value):
+        return {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+
+    def add_values(self, current, value):
+        if current is None:
+            return self.copy_value(value)
+        return {
+            "buckets": [a + b for a, b in zip(current["buckets"], value["buckets"])],
+            "sum": current["sum"] + value["sum"],
+            "count": current["count"] + value["count"],
+        }
+
+    def samples(self, openmetrics):
+        result = []
+        for key, state in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, state["buckets"]):
+                result.append((self.name + "_bucket", key + (("le", format_value(float(bound))),), count))
+            result.append((self.name + "_sum", key, round(state["sum"], 4)))
+            result.append((self.name + "_count", key, state["count"]))
+        return result
+
+LOGINS = Counter("keepalive_logins", "按登录方式统计的登录次数（cookie或password）", ["path", "result"])
+RUN_CLICKS = Counter("keepalive_run_clicks", "点击Run按钮的次数", ["result"])
+LOCATOR_HITS = Counter("keepalive_locator_hits", "各元素由第几种备选定位方法找到（0表示全部失败）", ["element", "strategy"])
+RETRIES = Counter("keepalive_retries", "登录或目标检查的重试次数", ["reason"])
+LOGIN_SECONDS = Histogram("keepalive_login_seconds", "一次完整登录（cookie加密码回退）的耗时")
+NAVIGATION_SECONDS = Histogram("keepalive_navigation_seconds", "导航到保活链接的耗时", ["target"])
+TIME_TO_RUNNING_SECONDS = Histogram("keepalive_time_to_running_seconds", "点击Run后到出现Running的耗时", ["result"])
+BROWSER_RSS_BYTES = Gauge("keepalive_browser_rss_bytes", "浏览器及其子进程的常驻内存")
+OPEN_PAGES = Gauge("keepalive_open_pages", "浏览器上下文中打开的页面数")
+TARGET_UP = Gauge("keepalive_target_up", "最近一次检查结束时目标是否在运行", ["target"])
+
+REGISTRY = [
+    LOGINS, RUN_CLICKS, LOCATOR_HITS, RETRIES, LOGIN_SECONDS, NAVIGATION_SECONDS,
+    TIME_TO_RUNNING_SECONDS, BROWSER_RSS_BYTES, OPEN_PAGES, TARGET_UP,
+]
+
+def observe_span(record):
+    """把telemetry记录的阶段转换成指标"""
+    name = record["name"]
+    attrs = record["attrs"]
+    ok = "ok" if record["status"] == "ok" else "error"
+    if name == "login":
+        LOGIN_SECONDS.observe(record["duration"])
+    elif name == "login.cookie" and attrs.get("session") == "valid":
+        LOGINS.inc(path="cookie", result="success" if attrs.get("success") else "failure")
+    elif name == "login.password":
+        LOGINS.inc(path="password", result=ok)
+    elif name == "navigate":
+        NAVIGATION_SECONDS.observe(record["duration"], target=attrs.get("url", ""))
+    elif name == "run_click":
+        RUN_CLICKS.inc(result="success" if attrs.get("result") else "failure")
+    elif name == "post_click_wait":
+        TIME_TO_RUNNING_SECONDS.observe(record["duration"], result="running" if attrs.get("result") else "timeout")
+    elif name.startswith("locator."):
+        strategy = attrs.get("strategy")
+        LOCATOR_HITS.inc(element=name[len("locator."):], strategy=strategy or 0)
+
+add_span_listener(observe_span)
+
+def snapshot():
+    """所有指标的当前值，工作进程把它随结果交给主进程合并（见sharding.py）"""
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+def merge(snapshot):
+    """合并工作进程的指标：计数器和直方图累加，仪表盘按标签相加（例如各进程浏览器的内存之和）"""
+    for metric in REGISTRY:
+        metric.merge(snapshot.get(metric.name, {}))
+
+def render(openmetrics=True):
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render(openmetrics)
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path=None):
+    """以Prometheus文本格式写入指标文件，先写临时文件再替换，避免collector读到半个文件"""
+    path = path or os.environ.get(METRICS_FILE_ENV, "")
+    if not path:
+        return
+    try:
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(render(openmetrics=False))
+        tmp_path.replace(path)
+    except Exception as e:
+        print(f"写入指标文件时出错: {str(e)}")
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=None):
+    """在后台线程中提供/metrics，未配置端口时返回None"""
+    port = port or os.environ.get(METRICS_PORT_ENV, "")
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+    except (OSError, ValueError) as e:
+        print(f"启动指标服务时出错: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"指标服务已启动: http://0.0.0.0:{server.server_address[1]}/metrics")
+    return server
+
+def update_browser_gauges(contexts, rss=None):
+    """更新浏览器内存和所有上下文中打开的页面数，rss为None时不更新内存"""
+    if rss is not None:
+        BROWSER_RSS_BYTES.set(rss)
+    try:
+        OPEN_PAGES.set(sum(len(context.pages) for context in contexts or [] if context))
+    except Exception:
+        pass
@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit, parse_qs
+
+# 模拟DeepNote和GitHub登录流程的本地服务器，配合DEEPNOTE_BASE_URL离线运行和测量main.py
+SESSION_COOKIE = "mock_session"
+SESSION_MAX_AGE = 7 * 24 * 3600
+PROJECT_ID = "0b6d3a52-9c1e-4f57-8a43-2d7e5f1c9b80"
+NOTEBOOK_PATH = f"/workspace/mock-workspace/project/Keepalive-{PROJECT_ID}/notebook/keepalive"
+
+# Run按钮的不同写法，编号与locators.RUN_BUTTON_STRATEGIES中首个能匹配的方法一致
+RUN_BUTTON_VARIANTS = {
+    1: '<button id="run" onclick="start()">Run</button>',
+    2: '<div id="run" role="button" aria-label="Run notebook" tabindex="0" onclick="start()">&#9654;</div>',
+    3: '<button id="run" class="run-machine" aria-label="Start machine" onclick="start()">&#9654;</button>',
+    4: '<button id="run" onclick="start()">Start</button>',
+}
+
+SIGN_IN_PAGE = """<!doctype html>
+<html><head><title>Sign in | Deepnote</title></head>
+<body>
+  <h1>Welcome back</h1>
+  <a href="/github/login?return_to=/workspace/mock-workspace">Continue with GitHub</a>
+</body></html>"""
+
+GITHUB_LOGIN_PAGE = """<!doctype html>
+<html><head><title>Sign in to GitHub</title></head>
+<body>
+  <form action="/github/session" method="post">
+    <input type="hidden" name="return_to" value="{return_to}">
+    <label for="login_field">Username or email address</label>
+    <input type="text" name="login" id="login_field" autocomplete="username">
+    <label for="password">Password</label>
+    <input type="password" name="password" id="password" autocomplete="current-password">
+    <input type="submit" name="commit" value="Sign in">
+  </form>
+  {error}
+</body></html>"""
+
+WORKSPACE_PAGE = """<!doctype html>
+<html><head><title>Workspace | Deepnote</title></head>
+<body><h1>Projects</h1><a href="{notebook}">Keepalive</a></body></html>"""
+
+NOTEBOOK_PAGE = """<!doctype html>
+<html><head><title>Keepalive | Deepnote</title></head>
+<body>
+  <header><span id="status">Loading</span>{run_button}</header>
+  <script>
+    const api = "/api/projects/{project_id}/machine";
+    function render(state) {{
+      document.getElementById("status").textContent =
+        state === "running" ? "Running" : state === "starting" ? "Starting" : "Stopped";
+      document.getElementById("run").style.display = state === "stopped" ? "" : "none";
+    }}
+    function refresh() {{
+      fetch(api).then(r => r.json()).then(data => render(data.status));
+    }}
+    function start() {{
+      fetch(api + "/start", {{method: "POST"}}).then(r => r.json()).then(data => render(data.status));
+    }}
+    setTimeout(() => {{ refresh(); setInterval(refresh, 500); }}, {render_delay});
+  </script>
+</body></html>"""
+
+class MockState:
+    """模拟服务器的场景配置和运行状态
+
+    run_delay：点击Run后机器进入Running所需的秒数；run_button：Run按钮写法（RUN_BUTTON_VARIANTS）；
+    render_delay：笔记本页面首次渲染状态前的毫秒数；running：机器初始是否在运行
+    """
+
+    def __init__(self, username="mock-user", password="mock-password", run_delay=3.0,
+                 run_button=1, render_delay=300, running=False):
+        self.username = username
+        self.password = password
+        self.run_delay = run_delay
+        self.run_button = run_button
+        self.render_delay = render_delay
+        self.running = running
+        self.started_at = None
+        self.sessions = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def new_session(self):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.sessions.add(token)
+        return token
+
+    def has_session(self, token):
+        with self.lock:
+            return token in self.sessions
+
+    def machine_status(self):
+        with self.lock:
+            if self.started_at is not None and time.monotonic() - self.started_at >= self.run_delay:
+                self.running = True
+                self.started_at = None
+            if self.running:
+                return "running"
+            return "starting" if self.started_at is not None else "stopped"
+
+    def start_machine(self):
+        with self.lock:
+            if not self.running and self.started_at is None:
+                self.started_at = time.monotonic()
+
+    def stop_machine(self):
+        with self.lock:
+            self.running = False
+            self.started_at = None
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockDeepnote/1.0"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def session_token(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        morsel = cookie.get(SESSION_COOKIE)
+        return morsel.value if morsel else None
+
+    def logged_in(self):
+        return self.state.has_session(self.session_token())
+
+    def send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def redirect(self, location, headers=None):
+        self.send(302, headers=dict(headers or {}, Location=location))
+
+    def send_json(self, data, status=200):
+        self.send(status, json.dumps(data), content_type="application/json")
+
+    def do_GET(self):
+        self.state.requests += 1
+        parts = urlsplit(self.path)
+        path = parts.path
+
+        if path == "/sign-in":
+            if self.logged_in():
+                return self.redirect("/workspace/mock-workspace")
+            return self.send(200, SIGN_IN_PAGE)
+
+        if path == "/github/login":
+            return_to = parse_qs(parts.query).get("return_to", ["/workspace/mock-workspace"])[0]
+            return self.send(200, GITHUB_LOGIN_PAGE.format(return_to=return_to, error=""))
+
+        match = re.fullmatch(r"/api/projects/([0-9a-f-]+)/machine", path)
+        if match:
+            if not self.logged_in():
+                return self.send_json({"error": "unauthorized"}, status=401)
+            return self.send_json({"projectId": match.group(1), "status": self.state.machine_status()})
+
+        if path.startswith("/workspace/"):
+            if not self.logged_in():
+                return self.redirect("/sign-in")
+            if path == NOTEBOOK_PATH:
+                page = NOTEBOOK_PAGE.format(
+                    project_id=PROJECT_ID,
+                    run_button=RUN_BUTTON_VARIANTS[self.state.run_button],
+                    render_delay=int(self.state.render_delay),
+                )
+                return self.send(200, page)
+            return self.send(200, WORKSPACE_PAGE.format(notebook=NOTEBOOK_PATH))
+
+        if path == "/":
+            return self.redirect("/sign-in")
+        return self.send(404, "Not found")
+
+    def do_POST(self):
+        self.state.requests += 1
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+
+        if path == "/github/session":
+            form = {key: values[0] for key, values in parse_qs(body).items()}
+            if form.get("login") != self.state.username or form.get("password") != self.state.password:
+                page = GITHUB_LOGIN_PAGE.format(
+                    return_to=form.get("return_to", ""), error="<p>Incorrect username or password.</p>")
+                return self.send(200, page)
+            token = self.state.new_session()
+            cookie = f"{SESSION_COOKIE}={token}; Path=/; Max-Age={SESSION_MAX_AGE}; HttpOnly; SameSite=Lax"
+            return self.redirect(form.get("return_to") or "/workspace/mock-workspace", {"Set-Cookie": cookie})
+
+        match = re.fullmatch(r"/api/projects/([0-9a-f-]+)/machine/start", path)
+        if match:
+            if not self.logged_in():
+                return self.send_json({"error": "unauthorized"}, status=401)
+            self.state.start_machine()
+            return self.send_json({"projectId": match.group(1), "status": self.state.machine_status()})
+
+        return self.send(404, "Not found")
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state=None, host="127.0.0.1", port=0, verbose=False):
+        super().__init__((host, port), MockHandler)
+        self.state = state or MockState()
+        self.verbose = verbose
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def notebook_url(self):
+        return self.base_url + NOTEBOOK_PATH
+
+    def start(self):
+        """在后台线程中运行，返回自身以便链式调用"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    # 单独运行：python mock_server.py，端口和场景通过环境变量配置
+    state = MockState(
+        run_delay=float(os.environ.get("MOCK_RUN_DELAY", "3")),
+        run_button=int(os.environ.get("MOCK_RUN_BUTTON", "1")),
+        render_delay=int(os.environ.get("MOCK_RENDER_DELAY", "300")),
+        running=os.environ.get("MOCK_RUNNING", "0") == "1",
+    )
+    server = MockServer(state, port=int(os.environ.get("MOCK_PORT", "8765")), verbose=True)
+    print(f"模拟服务器已启动: {server.base_url}")
+    print(f"保活链接: {server.notebook_url}")
+    print(f"凭据: GT_PW='{state.username} {state.password}'")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
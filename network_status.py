@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import time
+from urllib.parse import urlsplit
+from http_probe import RUNNING_STATES, STOPPED_STATES
+
+# 只解析URL或WebSocket消息中匹配该模式的数据，避免把无关接口里的"status"当成机器状态
+STATUS_PATTERN_ENV = "NETWORK_STATUS_PATTERN"
+DEFAULT_STATUS_PATTERN = r"machine|kernel|runtime|hardware"
+# 等待网页自身请求带回状态的最长时间（秒），超时后回退到检查页面文本，0表示不等待
+STATUS_TIMEOUT_ENV = "NETWORK_STATUS_TIMEOUT"
+DEFAULT_STATUS_TIMEOUT = 3
+# 收到的状态在该秒数内有效，之后视为未知；常驻模式复用页面时不会因旧状态一直判断为运行中
+STATUS_MAX_AGE_ENV = "NETWORK_STATUS_MAX_AGE"
+DEFAULT_STATUS_MAX_AGE = 30
+
+STATUS_KEY = re.compile(r"status|state", re.IGNORECASE)
+
+def status_pattern():
+    return re.compile(os.environ.get(STATUS_PATTERN_ENV, DEFAULT_STATUS_PATTERN), re.IGNORECASE)
+
+def status_timeout():
+    try:
+        return float(os.environ.get(STATUS_TIMEOUT_ENV, DEFAULT_STATUS_TIMEOUT))
+    except ValueError:
+        return DEFAULT_STATUS_TIMEOUT
+
+def status_max_age():
+    try:
+        return float(os.environ.get(STATUS_MAX_AGE_ENV, DEFAULT_STATUS_MAX_AGE))
+    except ValueError:
+        return DEFAULT_STATUS_MAX_AGE
+
+def parse_state(value):
+    state = value.lower()
+    if state in RUNNING_STATES:
+        return True
+    if state in STOPPED_STATES:
+        return False
+    return None
+
+def find_machine_status(data, pattern, in_scope=False):
+    """查找机器或内核的状态，运行返回True，停止返回False，无法判断返回None
+
+    只接受两种键：键名同时包含机器/内核（pattern）和status/state，例如"machineStatus"；
+    或者直接位于机器/内核对象中（in_scope，例如{"kernel": {"state": ...}}或状态接口返回的顶层对象）的status/state。
+    单元格执行等其他对象中的"state"不会被当成机器状态
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(value, str) and STATUS_KEY.search(key) and (in_scope or pattern.search(key)):
+                found = parse_state(value)
+                if found is not None:
+                    return found
+        for key, value in data.items():
+            if isinstance(value, (dict, list)):
+                found = find_machine_status(value, pattern, bool(pattern.search(key)))
+                if found is not None:
+                    return found
+    elif isinstance(data, list):
+        # socket.io消息形如["kernelStatus", {...}]，事件名说明了后面对象的含义
+        if data and isinstance(data[0], str) and pattern.search(data[0]) and STATUS_KEY.search(data[0]):
+            in_scope = True
+        for item in data:
+            found = find_machine_status(item, pattern, in_scope)
+            if found is not None:
+                return found
+    return None
+
+def parse_frame(payload):
+    """解析WebSocket文本消息，兼容socket.io的数字前缀（例如42["event", {...}]），无法解析返回None"""
+    if not isinstance(payload, str):
+        return None
+    text = re.sub(r"^\d+", "", payload)
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+class NetworkStatus:
+    """从页面自己的XHR/fetch响应和WebSocket消息中读取机器或内核状态
+
+    running为True/False表示最近一次收到的状态，None表示本次导航后还没有收到状态；
+    判断时应使用current()，超过NETWORK_STATUS_MAX_AGE秒的状态视为未知
+    """
+
+    def __init__(self):
+        self.pattern = status_pattern()
+        self.max_age = status_max_age()
+        self.running = None
+        self.source = None
+        self.updated_at = None
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """注册收到状态时调用的回调，参数为True/False（例如dom_watcher据此结束页面内的等待）"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def attach(self, page):
+        page.on("framenavigated", lambda frame: self.on_navigated(page, frame))
+        page.on("response", self.on_response)
+        page.on("websocket", self.on_websocket)
+
+    def attach_async(self, page):
+        page.on("framenavigated", lambda frame: self.on_navigated(page, frame))
+        page.on("response", self.on_response_async)
+        page.on("websocket", self.on_websocket)
+
+    def on_navigated(self, page, frame):
+        # 主框架导航到新页面后，之前的状态不再适用
+        if frame == page.main_frame:
+            self.running = None
+            self.source = None
+
+    def current(self):
+        """最近收到且未过期的状态，没有时返回None"""
+        if self.running is None or self.updated_at is None:
+            return None
+        if time.monotonic() - self.updated_at > self.max_age:
+            return None
+        return self.running
+
+    def update(self, data, source, in_scope=False):
+        found = find_machine_status(data, self.pattern, in_scope)
+        if found is not None:
+            self.running = found
+            self.source = source
+            self.updated_at = time.monotonic()
+            for callback in list(self.listeners):
+                callback(found)
+
+    def wants(self, response):
+        if response.request.resource_type not in ("xhr", "fetch"):
+            return False
+        if "json" not in (response.headers.get("content-type") or ""):
+            return False
+        return bool(self.pattern.search(response.url))
+
+    def on_response(self, response):
+        if not self.wants(response):
+            return
+        try:
+            # 地址本身就是机器或内核状态接口时，顶层的status/state即为所求
+            self.update(response.json(), response.url, bool(self.pattern.search(urlsplit(response.url).path)))
+        except Exception:
+            pass
+
+    async def on_response_async(self, response):
+        if not self.wants(response):
+            return
+        try:
+            self.update(await response.json(), response.url, bool(self.pattern.search(urlsplit(response.url).path)))
+        except Exception:
+            pass
+
+    def on_websocket(self, websocket):
+        websocket.on("framereceived", lambda payload: self.on_frame(websocket.url, payload))
+
+    def on_frame(self, url, payload):
+        if not isinstance(payload, str) or not self.pattern.search(payload):
+            return
+        data = parse_frame(payload)
+        if data is not None:
+            self.update(data, url)
+
+    def wait(self, page, timeout=None):
+        """等待收到状态，返回True/False；超时仍没有收到返回None
+
+        同步API只有在调用Playwright方法时才会分发事件，因此用wait_for_timeout分段等待
+        """
+        timeout = status_timeout() if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while self.current() is None and time.monotonic() < deadline:
+            page.wait_for_timeout(min(100, max(1, (deadline - time.monotonic()) * 1000)))
+        return self.current()
+
+    async def wait_async(self, page, timeout=None):
+        """wait的async_playwright版本"""
+        timeout = status_timeout() if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while self.current() is None and time.monotonic() < deadline:
+            await page.wait_for_timeout(min(100, max(1, (deadline - time.monotonic()) * 1000)))
+        return self.current()
+
+_statuses = {}
+
+def track_status(page):
+    """为页面挂上状态监听，页面创建后立即调用，重复调用无副作用"""
+    status = _statuses.get(page)
+    if status is None:
+        status = NetworkStatus()
+        status.attach(page)
+        _statuses[page] = status
+    return status
+
+def track_status_async(page):
+    """track_status的async_playwright版本"""
+    status = _statuses.get(page)
+    if status is None:
+        status = NetworkStatus()
+        status.attach_async(page)
+        _statuses[page] = status
+    return status
+
+def reset_status(context=None):
+    """清空页面状态记录，浏览器关闭后调用；传入context时只清理该上下文的页面"""
+    if context is None:
+        _statuses.clear()
+        return
+    for page in [page for page in _statuses if page.context == context]:
+        del _statuses[page]
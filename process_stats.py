@@ -0,0 +1,46 @@
+import os
+
+def child_pids(root_pid):
+    """返回root_pid的所有后代进程ID（通过/proc读取，非Linux系统返回空列表）"""
+    parents = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 进程名可能包含空格和括号，从最后一个右括号之后开始解析
+        fields = stat[stat.rfind(")") + 2:].split()
+        parents.setdefault(int(fields[1]), []).append(int(entry))
+
+    descendants = []
+    stack = [root_pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            descendants.append(child)
+            stack.append(child)
+    return descendants
+
+def process_rss(pid):
+    """返回进程的常驻内存（字节），读取失败返回0"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+def browser_rss(root_pid=None):
+    """返回当前进程所有子进程（Playwright驱动和浏览器）的常驻内存之和，无法读取时返回None"""
+    if not os.path.isdir("/proc"):
+        return None
+    pids = child_pids(root_pid or os.getpid())
+    return sum(process_rss(pid) for pid in pids)
@@ -0,0 +1,158 @@
+import time
+from playwright.sync_api import TimeoutError
+from telemetry import span
+
+# Playwright判定networkidle的条件：至少500毫秒没有网络请求
+NETWORK_IDLE_QUIET = 0.5
+
+class NetworkActivity:
+    """记录页面上每个请求的起止时间，用于事后估算networkidle何时才会到来"""
+
+    def __init__(self):
+        self.pending = {}
+        self.intervals = []
+
+    def attach(self, page):
+        page.on("request", self.on_request)
+        page.on("requestfinished", self.on_request_done)
+        page.on("requestfailed", self.on_request_done)
+
+    def on_request(self, request):
+        self.pending[request] = time.time()
+
+    def on_request_done(self, request):
+        started = self.pending.pop(request, None)
+        ended = time.time()
+        # 事件可能延迟分发，优先使用浏览器记录的真实时间
+        try:
+            timing = request.timing
+            if timing["startTime"] > 0 and timing["responseEnd"] >= 0:
+                started = timing["startTime"] / 1000
+                ended = started + timing["responseEnd"] / 1000
+        except Exception:
+            pass
+        if started is not None:
+            self.intervals.append((started, ended))
+
+    def idle_reached_at(self, start, deadline, observed_until):
+        """返回[start, deadline]内首次满足networkidle的时间，超时返回None，无法判断返回False"""
+        intervals = list(self.intervals)
+        intervals += [(started, observed_until) for started in self.pending.values()]
+        intervals = sorted(iv for iv in intervals if iv[1] > start)
+        cursor = start
+        for iv_start, iv_end in intervals:
+            if iv_start - cursor >= NETWORK_IDLE_QUIET:
+                break
+            cursor = max(cursor, iv_end)
+        idle_at = cursor + NETWORK_IDLE_QUIET
+        if idle_at <= deadline and idle_at <= max(observed_until, start):
+            return idle_at
+        if observed_until >= deadline:
+            return None
+        return False
+
+_activities = {}
+_steps = []
+
+def track_network(page):
+    """为页面挂上请求记录，页面创建后立即调用，重复调用无副作用"""
+    activity = _activities.get(page)
+    if activity is None:
+        activity = NetworkActivity()
+        activity.attach(page)
+        _activities[page] = activity
+    return activity
+
+def record_step(page, step, started, ended, old_timeout):
+    _steps.append({
+        "page": page,
+        "step": step,
+        "activity": track_network(page),
+        "started": started,
+        "elapsed": ended - started,
+        "old_timeout": old_timeout,
+    })
+
+def wait_ready(page, step, locator=None, url=None, timeout=10000):
+    """等待该步骤真正需要的URL或元素出现，代替networkidle等待，返回是否就绪
+
+    timeout与原先networkidle的超时一致（毫秒），用于估算节省的时间
+    """
+    started = time.time()
+    ready = True
+    with span(f"ready.{step}") as attrs:
+        try:
+            if url:
+                page.wait_for_url(url, timeout=timeout)
+            if locator is not None:
+                remaining = max(1, timeout - (time.time() - started) * 1000)
+                locator.filter(visible=True).first.wait_for(state="visible", timeout=remaining)
+        except TimeoutError:
+            ready = False
+        attrs["ready"] = ready
+    record_step(page, step, started, time.time(), timeout / 1000)
+    return ready
+
+async def wait_ready_async(page, step, locator=None, url=None, timeout=10000):
+    """wait_ready的async_playwright版本"""
+    started = time.time()
+    ready = True
+    with span(f"ready.{step}") as attrs:
+        try:
+            if url:
+                await page.wait_for_url(url, timeout=timeout)
+            if locator is not None:
+                remaining = max(1, timeout - (time.time() - started) * 1000)
+                await locator.filter(visible=True).first.wait_for(state="visible", timeout=remaining)
+        except TimeoutError:
+            ready = False
+        attrs["ready"] = ready
+    record_step(page, step, started, time.time(), timeout / 1000)
+    return ready
+
+def report_readiness(context=None):
+    """打印每个步骤的就绪等待耗时，以及原networkidle等待会超时的次数和预计节省的秒数，传入context时只统计该上下文的页面"""
+    steps = [entry for entry in _steps if context is None or entry["page"].context == context]
+    if not steps:
+        return
+    now = time.time()
+    summary = {}
+    for entry in steps:
+        stats = summary.setdefault(entry["step"], {"count": 0, "timeouts": 0, "unknown": 0, "elapsed": 0.0, "saved": 0.0})
+        stats["count"] += 1
+        stats["elapsed"] += entry["elapsed"]
+        deadline = entry["started"] + entry["old_timeout"]
+        idle_at = entry["activity"].idle_reached_at(entry["started"], deadline, now)
+        if idle_at is False:
+            stats["unknown"] += 1
+            continue
+        if idle_at is None:
+            stats["timeouts"] += 1
+            old_cost = entry["old_timeout"]
+        else:
+            old_cost = idle_at - entry["started"]
+        stats["saved"] += old_cost - entry["elapsed"]
+
+    print("就绪等待统计（与原networkidle等待对比）:")
+    total_saved = 0.0
+    for step, stats in summary.items():
+        total_saved += stats["saved"]
+        line = (f"  {step}: {stats['count']}次，共耗时{stats['elapsed']:.1f}秒，"
+                f"networkidle会超时{stats['timeouts']}次，预计节省{stats['saved']:.1f}秒")
+        if stats["unknown"]:
+            line += f"（{stats['unknown']}次无法判断）"
+        print(line)
+    print(f"  合计预计节省{total_saved:.1f}秒")
+
+def reset_readiness(context=None):
+    """清空已记录的步骤和页面请求记录，浏览器关闭后调用，避免常驻进程中无限增长
+
+    传入context时只清理该上下文的页面，其他上下文中仍在使用的页面保留记录（不会重复挂监听）
+    """
+    if context is None:
+        _steps.clear()
+        _activities.clear()
+        return
+    _steps[:] = [entry for entry in _steps if entry["page"].context != context]
+    for page in [page for page in _activities if page.context == context]:
+        del _activities[page]
@@ -0,0 +1,167 @@
+import os
+import time
+import random
+import asyncio
+from waits import wait_until, wait_until_async, pause
+
+# 整次运行的时间预算（秒），重试等待和页面操作的超时都从中扣除，用完后不再重试，0表示不限制；
+# 默认值略短于sharding.py的单账号超时（900秒），超时被强制结束前自行收尾并保存结果
+RUN_DEADLINE_ENV = "KEEPALIVE_RUN_DEADLINE"
+DEFAULT_RUN_DEADLINE = 840
+# 重试间隔：RETRY_BASE_DELAY * 2^(第几次失败-1)，最长RETRY_MAX_DELAY秒，再乘以0.5~1.5的随机抖动
+RETRY_BASE_ENV = "RETRY_BASE_DELAY"
+DEFAULT_RETRY_BASE = 2
+RETRY_MAX_ENV = "RETRY_MAX_DELAY"
+DEFAULT_RETRY_MAX = 20
+RETRY_FACTOR = 2
+RETRY_JITTER = 0.5
+# 每种操作的最多尝试次数，可用RETRY_ATTEMPTS_<操作名大写>覆盖，例如RETRY_ATTEMPTS_LOGIN=5
+ATTEMPTS_ENV_PREFIX = "RETRY_ATTEMPTS_"
+DEFAULT_ATTEMPTS = {"login": 3, "navigate": 3}
+
+def get_number_env(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        print(f"错误: {name}环境变量设置不正确，使用默认值{default}")
+        return default
+
+class Deadline:
+    """一次运行的时间预算，budget为0或None时不限制"""
+
+    def __init__(self, budget=None):
+        self.budget = budget or 0
+        self.started = time.monotonic()
+
+    def remaining(self):
+        """剩余秒数，不限制时返回None"""
+        if not self.budget:
+            return None
+        return max(0.0, self.budget - (time.monotonic() - self.started))
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def clamp(self, seconds):
+        """把等待时间（秒）限制在剩余预算内"""
+        remaining = self.remaining()
+        return seconds if remaining is None else min(seconds, remaining)
+
+    def clamp_ms(self, milliseconds):
+        """把Playwright的超时（毫秒）限制在剩余预算内，至少1毫秒（Playwright中0表示不限制）"""
+        remaining = self.remaining()
+        if remaining is None:
+            return milliseconds
+        return max(1, int(min(milliseconds, remaining * 1000)))
+
+_deadline = Deadline()
+
+def start_deadline(budget=None):
+    """开始一次运行的计时，budget为None时读取KEEPALIVE_RUN_DEADLINE"""
+    global _deadline
+    if budget is None:
+        budget = get_number_env(RUN_DEADLINE_ENV, DEFAULT_RUN_DEADLINE)
+    _deadline = Deadline(budget)
+    if budget:
+        print(f"本次运行的时间预算为{budget:.0f}秒")
+    return _deadline
+
+def reset_deadline():
+    global _deadline
+    _deadline = Deadline()
+
+def remaining():
+    return _deadline.remaining()
+
+def expired():
+    return _deadline.expired()
+
+def clamp(seconds):
+    return _deadline.clamp(seconds)
+
+def clamp_ms(milliseconds):
+    return _deadline.clamp_ms(milliseconds)
+
+def get_attempts(operation):
+    default = DEFAULT_ATTEMPTS.get(operation, 3)
+    return max(1, int(get_number_env(ATTEMPTS_ENV_PREFIX + operation.upper(), default)))
+
+class RetryPolicy:
+    """一种操作的重试策略：最多尝试次数、带抖动的指数退避，等待时间不超过运行的剩余预算"""
+
+    def __init__(self, operation, attempts=None, base=None, maximum=None, factor=RETRY_FACTOR, jitter=RETRY_JITTER):
+        self.operation = operation
+        self.max_attempts = attempts or get_attempts(operation)
+        self.base = base if base is not None else get_number_env(RETRY_BASE_ENV, DEFAULT_RETRY_BASE)
+        self.maximum = maximum if maximum is not None else get_number_env(RETRY_MAX_ENV, DEFAULT_RETRY_MAX)
+        self.factor = factor
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """第attempt次尝试失败后的等待时间（秒）"""
+        delay = min(self.maximum, self.base * self.factor ** (attempt - 1))
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return clamp(delay)
+
+    def can_retry(self, attempt):
+        return attempt < self.max_attempts and not expired()
+
+    def attempts(self):
+        """依次生成尝试序号（从1开始），次数用完或运行预算耗尽时停止"""
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1 and expired():
+                print(f"运行时间预算已用完，停止重试（{self.operation}）")
+                return
+            yield attempt
+
+    def wait(self, attempt, condition=None, page=None):
+        """重试前等待，传入condition时条件满足即提前结束，返回condition的结果
+
+        同步API中传入page时用page.wait_for_timeout等待，等待期间继续处理路由拦截和页面事件
+        """
+        delay = self.delay(attempt)
+        print(f"等待{delay:.1f}秒后重试")
+        if condition is not None:
+            return wait_until(condition, delay, page=page)
+        pause(delay, page)
+        return False
+
+    async def wait_async(self, attempt, condition=None):
+        """wait的asyncio版本，condition为协程函数"""
+        delay = self.delay(attempt)
+        print(f"等待{delay:.1f}秒后重试")
+        if condition is not None:
+            return await wait_until_async(condition, delay)
+        await asyncio.sleep(delay)
+        return False
+
+    def call(self, func, retry_on=(Exception,), label=None, page=None):
+        """调用func，抛出retry_on中的异常时按策略重试，次数用完或预算耗尽时抛出最后一次的异常"""
+        label = label or self.operation
+        attempt = 0
+        while True:
+            attempt += 1
+            print(f"{label}尝试 {attempt}/{self.max_attempts}")
+            try:
+                return func()
+            except retry_on:
+                if not self.can_retry(attempt):
+                    raise
+                print(f"{label}失败")
+                self.wait(attempt, page=page)
+
+    async def call_async(self, func, retry_on=(Exception,), label=None):
+        """call的asyncio版本，func为协程函数"""
+        label = label or self.operation
+        attempt = 0
+        while True:
+            attempt += 1
+            print(f"{label}尝试 {attempt}/{self.max_attempts}")
+            try:
+                return await func()
+            except retry_on:
+                if not self.can_retry(attempt):
+                    raise
+                print(f"{label}失败")
+                await self.wait_async(attempt)
@@ -0,0 +1,120 @@
+import os
+from urllib.parse import urlsplit
+
+# 查找按钮和读取运行状态都用不到的资源类型；样式表会影响元素可见性，因此不拦截
+DEFAULT_BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+# 统计分析和第三方追踪服务
+DEFAULT_BLOCKED_HOSTS = {
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "segment.io",
+    "segment.com",
+    "sentry.io",
+    "intercom.io",
+    "intercomcdn.com",
+    "hotjar.com",
+    "mixpanel.com",
+    "amplitude.com",
+    "fullstory.com",
+    "heapanalytics.com",
+    "facebook.net",
+    "hs-analytics.net",
+    "hubspot.com",
+    "collector.github.com",
+}
+
+def parse_list(value):
+    return {item.strip().lower() for item in value.split(",") if item.strip()}
+
+def host_matches(host, domains):
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+class RequestBlocker:
+    """按资源类型和主机拦截请求，并统计拦截次数和放行请求的字节数
+
+    环境变量：
+    BLOCK_ASSETS=0 关闭拦截；BLOCK_RESOURCE_TYPES 覆盖拦截的资源类型；
+    BLOCK_HOSTS 追加拦截的主机；ALLOW_HOSTS 中的主机始终放行
+    """
+
+    def __init__(self, resource_types=None, blocked_hosts=None, allowed_hosts=None):
+        if resource_types is None:
+            resource_types = parse_list(os.environ.get("BLOCK_RESOURCE_TYPES", "")) or DEFAULT_BLOCKED_RESOURCE_TYPES
+        if blocked_hosts is None:
+            blocked_hosts = DEFAULT_BLOCKED_HOSTS | parse_list(os.environ.get("BLOCK_HOSTS", ""))
+        if allowed_hosts is None:
+            allowed_hosts = parse_list(os.environ.get("ALLOW_HOSTS", ""))
+        self.resource_types = set(resource_types)
+        self.blocked_hosts = set(blocked_hosts)
+        self.allowed_hosts = set(allowed_hosts)
+        self.blocked = {}
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+
+    def block_reason(self, request):
+        """返回拦截原因，放行时返回None"""
+        host = (urlsplit(request.url).hostname or "").lower()
+        if host_matches(host, self.allowed_hosts):
+            return None
+        if host_matches(host, self.blocked_hosts):
+            return f"host:{host}"
+        if request.resource_type in self.resource_types:
+            return f"type:{request.resource_type}"
+        return None
+
+    def count_blocked(self, reason):
+        self.blocked[reason] = self.blocked.get(reason, 0) + 1
+
+    def on_response(self, response):
+        # 只读取响应头中的长度，避免为统计而额外请求响应体
+        try:
+            self.allowed_bytes += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    def handle(self, route):
+        reason = self.block_reason(route.request)
+        if reason:
+            self.count_blocked(reason)
+            route.abort("blockedbyclient")
+        else:
+            self.allowed_requests += 1
+            route.continue_()
+
+    async def handle_async(self, route):
+        reason = self.block_reason(route.request)
+        if reason:
+            self.count_blocked(reason)
+            await route.abort("blockedbyclient")
+        else:
+            self.allowed_requests += 1
+            await route.continue_()
+
+    def report(self):
+        total = sum(self.blocked.values())
+        print(f"请求拦截统计：拦截{total}个请求，放行{self.allowed_requests}个请求（约{self.allowed_bytes / 1024:.0f}KB）")
+        for reason, count in sorted(self.blocked.items(), key=lambda item: -item[1]):
+            print(f"  {reason}: {count}")
+
+def blocking_enabled():
+    return os.environ.get("BLOCK_ASSETS", "1") != "0"
+
+def install_routing(context):
+    """在浏览器上下文上安装请求拦截，未启用时返回None"""
+    if not blocking_enabled():
+        return None
+    blocker = RequestBlocker()
+    context.route("**/*", blocker.handle)
+    context.on("response", blocker.on_response)
+    return blocker
+
+async def install_routing_async(context):
+    """install_routing的async_playwright版本"""
+    if not blocking_enabled():
+        return None
+    blocker = RequestBlocker()
+    await context.route("**/*", blocker.handle_async)
+    context.on("response", blocker.on_response)
+    return blocker
@@ -0,0 +1,141 @@
+import json
+import time
+import random
+from pathlib import Path
+
+SCHEDULE_STATE_FILE = Path("schedule_state.json")
+
+# 没有足够观测数据时的检查间隔（秒）
+DEFAULT_INTERVAL = 300
+# 两次检查之间的最短和最长间隔（秒）
+MIN_INTERVAL = 60
+MAX_INTERVAL = 3600
+# 在预计关机时间之前提前多久检查：预计运行时长的10%，至少60秒
+MARGIN_RATIO = 0.1
+MIN_MARGIN = 60
+# 失败目标的退避：BACKOFF_BASE * 2^(失败次数-1)，最长BACKOFF_MAX秒，再乘以0.5~1.5的随机抖动
+BACKOFF_BASE = 60
+BACKOFF_MAX = 1800
+# 每个目标保留的运行时长样本数
+MAX_UPTIME_SAMPLES = 20
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+class AdaptiveScheduler:
+    """根据每个目标观测到的运行时长安排下一次检查
+
+    记录目标最后一次被看到运行和被发现停止的时间，据此估算笔记本闲置关机前的运行时长，
+    在预计关机前安排检查；检查失败的目标使用带抖动的指数退避
+    """
+
+    def __init__(self, path=SCHEDULE_STATE_FILE, default_interval=DEFAULT_INTERVAL):
+        self.path = Path(path)
+        self.default_interval = default_interval
+        self.targets = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    self.targets = json.load(f)
+            except Exception as e:
+                print(f"读取调度状态时出错，重新开始统计: {str(e)}")
+                self.targets = {}
+
+    def target(self, url):
+        return self.targets.setdefault(url, {
+            "running_since": None,
+            "last_seen_running": None,
+            "last_found_stopped": None,
+            "uptimes": [],
+            "failures": 0,
+            "next_check": 0,
+        })
+
+    def expected_uptime(self, url):
+        """返回该目标预计的闲置关机前运行时长（秒），没有样本时返回None"""
+        uptimes = self.target(url)["uptimes"]
+        return median(uptimes) if uptimes else None
+
+    def record(self, url, was_running, restarted, ok, now=None):
+        """记录一次检查结果并安排下一次检查
+
+        was_running：检查时应用已在运行；restarted：本次点击了Run；ok：检查结束时应用正在运行
+        """
+        now = now or time.time()
+        state = self.target(url)
+        if was_running:
+            if state["running_since"] is None:
+                state["running_since"] = now
+            state["last_seen_running"] = now
+        else:
+            state["last_found_stopped"] = now
+            if state["running_since"] is not None and state["last_seen_running"] is not None:
+                # 实际关机时间介于最后一次看到运行和本次发现停止之间，取中点
+                stopped_at = (state["last_seen_running"] + now) / 2
+                uptime = stopped_at - state["running_since"]
+                if uptime > 0:
+                    state["uptimes"].append(round(uptime))
+                    del state["uptimes"][:-MAX_UPTIME_SAMPLES]
+            state["running_since"] = None
+        if restarted and ok:
+            state["running_since"] = now
+            state["last_seen_running"] = now
+
+        if ok:
+            state["failures"] = 0
+            delay = self.running_delay(url, now)
+        else:
+            state["failures"] += 1
+            delay = self.backoff_delay(state["failures"])
+        state["next_check"] = now + delay
+        print(f"下次检查 {url or '(登录页面)'}: {delay / 60:.1f}分钟后")
+        self.save()
+
+    def running_delay(self, url, now):
+        """应用正在运行时，距离下一次检查的秒数：预计关机时间前一点，没有样本时使用默认间隔"""
+        state = self.target(url)
+        expected = self.expected_uptime(url)
+        if expected is None or state["running_since"] is None:
+            return self.default_interval
+        margin = max(MIN_MARGIN, expected * MARGIN_RATIO)
+        due = state["running_since"] + expected - margin
+        return min(MAX_INTERVAL, max(MIN_INTERVAL, due - now))
+
+    def backoff_delay(self, failures):
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+        return delay * random.uniform(0.5, 1.5)
+
+    def due_targets(self, urls, now=None):
+        """返回已经到了检查时间的目标"""
+        now = now or time.time()
+        return [url for url in urls if self.target(url)["next_check"] <= now]
+
+    def seconds_until_next(self, urls, now=None):
+        """返回距离最近一个目标检查时间的秒数"""
+        now = now or time.time()
+        if not urls:
+            return self.default_interval
+        return max(0, min(self.target(url)["next_check"] for url in urls) - now)
+
+    def save(self):
+        try:
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.targets, f)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            print(f"保存调度状态时出错: {str(e)}")
+
+if __name__ == "__main__":
+    # 打印每个目标的学习结果和下次检查时间
+    scheduler = AdaptiveScheduler()
+    now = time.time()
+    for url, state in scheduler.targets.items():
+        expected = scheduler.expected_uptime(url)
+        expected_text = f"{expected / 60:.0f}分钟" if expected else "未知"
+        print(f"{url}: 预计运行时长{expected_text}（{len(state['uptimes'])}个样本），"
+              f"连续失败{state['failures']}次，{max(0, state['next_check'] - now) / 60:.1f}分钟后检查")
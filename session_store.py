@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import time
+import asyncio
+from pathlib import Path
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:
+    # Windows上没有fcntl，此时不加锁，多个进程可能同时执行密码登录
+    fcntl = None
+
+# Playwright storage_state快照（cookies和localStorage）及其cookie过期时间索引
+STORAGE_STATE_FILE = Path("deepnote_storage_state.json")
+SESSION_INDEX_FILE = Path("deepnote_session_index.json")
+# 旧版本只保存cookie列表，没有快照时仍然读取
+LEGACY_COOKIE_FILE = Path("deepnote_cookies.json")
+# 多账号时其他账号的会话快照保存在该目录下，每个账号一对文件
+SESSION_DIR = Path("sessions")
+
+# 多个进程（例如同时运行的main.py和main2.py）共用一个会话快照时，同一时间只有一个进程执行密码登录，
+# 其他进程最多等待该秒数，之后使用它保存的新会话
+SESSION_LOCK_TIMEOUT_ENV = "SESSION_LOCK_TIMEOUT"
+DEFAULT_SESSION_LOCK_TIMEOUT = 180
+
+# 登录状态所在cookie的名称（正则表达式，不区分大小写）；同域名下的同意、统计和设备ID等长期cookie不算在内，
+# 否则其中一个长期有效就会让过期的会话一直被判断为有效
+AUTH_COOKIE_PATTERN_ENV = "DEEPNOTE_AUTH_COOKIE_PATTERN"
+DEFAULT_AUTH_COOKIE_PATTERN = r"session|sid|auth|token|jwt"
+
+# DeepNote地址，可通过DEEPNOTE_BASE_URL指向本地模拟服务器（见mock_server.py）
+DEFAULT_BASE_URL = "https://deepnote.com"
+
+def get_base_url():
+    return os.environ.get("DEEPNOTE_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+
+def auth_cookie_domain():
+    """登录状态保存在DeepNote域名（默认deepnote.com）的cookie中"""
+    return urlsplit(get_base_url()).hostname or ""
+
+def auth_cookie_pattern():
+    return re.compile(os.environ.get(AUTH_COOKIE_PATTERN_ENV, DEFAULT_AUTH_COOKIE_PATTERN), re.IGNORECASE)
+
+def is_deepnote_cookie(cookie, auth_domain=None):
+    """DeepNote域名（含子域名）下的cookie"""
+    auth_domain = auth_domain or auth_cookie_domain()
+    domain = cookie.get("domain", "").lstrip(".")
+    return domain == auth_domain or domain.endswith("." + auth_domain)
+
+def is_auth_cookie(cookie, auth_domain=None):
+    """DeepNote域名下、名称匹配DEEPNOTE_AUTH_COOKIE_PATTERN的cookie"""
+    return is_deepnote_cookie(cookie, auth_domain) and bool(auth_cookie_pattern().search(cookie.get("name", "")))
+
+def build_index(state, auth_domain=None):
+    """为快照建立索引：每个登录cookie的过期时间，以及其中最早的过期时间（任一登录cookie过期会话即失效）"""
+    auth_cookies = {
+        cookie["name"]: cookie.get("expires", -1)
+        for cookie in state.get("cookies", [])
+        if is_auth_cookie(cookie, auth_domain)
+    }
+    expiries = [expires for expires in auth_cookies.values() if expires and expires > 0]
+    return {
+        "saved_at": time.time(),
+        "auth_cookies": auth_cookies,
+        # 登录cookie都是没有过期时间的会话cookie时无法按时间判断为过期
+        "expires_at": min(expiries) if expiries else None,
+    }
+
+def account_session_files(name):
+    """返回账号专用的(快照文件, 索引文件)，name只能包含文件名允许的字符（见accounts.account_name）"""
+    return SESSION_DIR / f"{name}_storage_state.json", SESSION_DIR / f"{name}_session_index.json"
+
+def write_json_atomic(data, path):
+    """先写同目录下的临时文件再重命名，其他进程不会读到写了一半的文件"""
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def write_session(state, state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE):
+    """写入storage_state快照和过期时间索引"""
+    Path(state_file).parent.mkdir(parents=True, exist_ok=True)
+    write_json_atomic(state, state_file)
+    write_json_atomic(build_index(state), index_file)
+
+def save_session(context, state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE):
+    """保存上下文的storage_state（cookies和localStorage）"""
+    write_session(context.storage_state(), state_file, index_file)
+
+async def save_session_async(context, state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE):
+    """save_session的async_playwright版本"""
+    write_session(await context.storage_state(), state_file, index_file)
+
+def load_session(state_file=STORAGE_STATE_FILE, legacy_file=LEGACY_COOKIE_FILE):
+    """读取保存的会话，返回storage_state格式的字典，没有保存的会话时返回None
+
+    旧版cookie文件只属于默认账号，读取账号专用的快照时不会回退到它
+    """
+    paths = [state_file]
+    if legacy_file and Path(state_file) == STORAGE_STATE_FILE:
+        paths.append(legacy_file)
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取会话文件{path}时出错: {str(e)}")
+            continue
+        if isinstance(data, list):
+            return {"cookies": data, "origins": []}
+        return data
+    return None
+
+def session_version(state_file=STORAGE_STATE_FILE):
+    """会话快照的修改时间（纳秒），没有快照时返回None，用于判断其他进程是否刚保存了新会话"""
+    try:
+        return os.stat(state_file).st_mtime_ns
+    except OSError:
+        return None
+
+def session_lock_timeout():
+    try:
+        return float(os.environ.get(SESSION_LOCK_TIMEOUT_ENV, DEFAULT_SESSION_LOCK_TIMEOUT))
+    except ValueError:
+        return DEFAULT_SESSION_LOCK_TIMEOUT
+
+class SessionLock:
+    """会话快照旁的文件锁（<快照文件>.lock），保证同一账号同时只有一个进程执行密码登录
+
+    acquire等待期间其他进程可能已经完成登录，调用方应在拿到锁后检查session_version是否变化
+    """
+
+    def __init__(self, state_file=STORAGE_STATE_FILE, timeout=None):
+        self.path = Path(f"{state_file}.lock")
+        self.timeout = session_lock_timeout() if timeout is None else timeout
+        self.file = None
+        self.waited = False
+
+    def try_acquire(self):
+        if fcntl is None:
+            return True
+        if self.file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, "a")
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        """获取锁，返回是否拿到；超过timeout秒仍未拿到时返回False，调用方不加锁继续执行"""
+        deadline = time.monotonic() + self.timeout
+        while not self.try_acquire():
+            if not self.waited:
+                print("其他进程正在登录同一账号，等待其完成")
+                self.waited = True
+            if time.monotonic() >= deadline:
+                print(f"等待{self.timeout:.0f}秒后仍未拿到会话锁，不再等待")
+                return False
+            time.sleep(0.5)
+        return True
+
+    async def acquire_async(self):
+        """acquire的asyncio版本"""
+        deadline = time.monotonic() + self.timeout
+        while not self.try_acquire():
+            if not self.waited:
+                print("其他进程正在登录同一账号，等待其完成")
+                self.waited = True
+            if time.monotonic() >= deadline:
+                print(f"等待{self.timeout:.0f}秒后仍未拿到会话锁，不再等待")
+                return False
+            await asyncio.sleep(0.5)
+        return True
+
+    def release(self):
+        if self.file is not None:
+            # 关闭文件即释放flock
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+def refreshed_session(version, state_file=STORAGE_STATE_FILE, index_file=SESSION_INDEX_FILE):
+    """其他进程在version之后保存了未过期的新会话时返回该会话，否则返回None"""
+    current = session_version(state_file)
+    if current is None or current == version:
+        return None
+    state = load_session(state_file, legacy_file=None)
+    if session_status(state, index_file) != "valid":
+        return None
+    return state
+
+def load_index(state, index_file=SESSION_INDEX_FILE):
+    """读取过期时间索引，索引缺失时根据快照重新计算"""
+    try:
+        with open(index_file, "r") as f:
+            return json.load(f)
+    except Exception:
+        return build_index(state)
+
+def session_status(state, index_file=SESSION_INDEX_FILE):
+    """返回"missing"、"expired"、"valid"或"unknown"，只根据cookie过期时间判断，不发起任何请求
+
+    没有cookie名称匹配DEEPNOTE_AUTH_COOKIE_PATTERN时无法按时间判断，返回"unknown"，
+    调用方仍应尝试cookie登录，由导航结果判断会话是否有效；只有"expired"和"missing"应直接进行密码登录
+    """
+    if not state or not state.get("cookies"):
+        return "missing"
+    index = load_index(state, index_file)
+    if not index.get("auth_cookies"):
+        return "unknown"
+    expires_at = index.get("expires_at")
+    if expires_at is not None and expires_at <= time.time():
+        return "expired"
+    return "valid"
+
+def session_alive(cookies, page_urls=(), auth_domain=None):
+    """根据上下文中的cookie和页面当前地址判断登录状态是否仍然有效，不发起任何请求
+
+    任一页面被重定向到登录页面或任一登录cookie已过期时返回False；没有cookie名称匹配DEEPNOTE_AUTH_COOKIE_PATTERN时
+    无法按时间判断，只要还有DeepNote域名的cookie且页面没有被重定向到登录页面就视为有效
+    """
+    if any("sign-in" in url for url in page_urls):
+        return False
+    now = time.time()
+    auth_cookies = [cookie for cookie in cookies if is_auth_cookie(cookie, auth_domain)]
+    if not auth_cookies:
+        return any(is_deepnote_cookie(cookie, auth_domain) for cookie in cookies)
+    return all(not 0 < cookie.get("expires", -1) <= now for cookie in auth_cookies)
+
+def local_storage_script(state):
+    """生成恢复localStorage的初始化脚本，只写入页面上不存在的键"""
+    items = {
+        origin["origin"]: {entry["name"]: entry["value"] for entry in origin.get("localStorage", [])}
+        for origin in state.get("origins", [])
+    }
+    return (
+        "(() => {"
+        f" const items = {json.dumps(items)}[window.location.origin];"
+        " if (!items) return;"
+        " for (const [key, value] of Object.entries(items)) {"
+        "  if (window.localStorage.getItem(key) === null) window.localStorage.setItem(key, value);"
+        " }"
+        "})();"
+    )
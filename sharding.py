@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import queue
+import signal
+import multiprocessing
+from playwright.sync_api import sync_playwright
+from accounts import load_accounts
+from scheduler import AdaptiveScheduler
+from main import run, run_daemon, record_observations, get_int_env
+import metrics
+
+# 多账号保活：每个账号在独立的工作进程中使用自己的浏览器，进程数默认等于CPU核数
+WORKERS_ENV = "KEEPALIVE_WORKERS"
+# 单个账号的最长运行时间（秒），超时后结束该账号的进程及其浏览器
+ACCOUNT_TIMEOUT_ENV = "KEEPALIVE_ACCOUNT_TIMEOUT"
+DEFAULT_ACCOUNT_TIMEOUT = 900
+
+def account_key(account):
+    return account.name or account.username
+
+def shard_worker(account, results):
+    """工作进程入口：保活一个账号，把结果放入results队列"""
+    # 单独的进程组，超时时可以连同Playwright驱动和浏览器一起结束
+    os.setpgrp()
+    # 多个进程同时写同一个指标文件会互相覆盖，工作进程把指标随结果交给主进程统一写入
+    os.environ.pop(metrics.METRICS_FILE_ENV, None)
+    started = time.monotonic()
+    result = {"account": account_key(account), "status": "error", "pending": list(account.urls), "observations": {}}
+    try:
+        with sync_playwright() as playwright:
+            outcome = run(playwright, account=account, schedule=False)
+        result.update(outcome)
+        result["status"] = "ok" if not outcome["pending"] else "failed"
+    except Exception as e:
+        result["error"] = str(e)
+    result["elapsed"] = time.monotonic() - started
+    result["metrics"] = metrics.snapshot()
+    results.put(result)
+
+def kill_worker(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        process.kill()
+    process.join()
+
+def run_sharded(accounts, workers=None, timeout=None):
+    """把账号分配到多个工作进程并行保活，某个账号卡住或崩溃不影响其他账号，返回每个账号的结果"""
+    workers = workers or get_int_env(WORKERS_ENV, os.cpu_count() or 1)
+    workers = max(1, min(workers, len(accounts)))
+    timeout = timeout or get_int_env(ACCOUNT_TIMEOUT_ENV, DEFAULT_ACCOUNT_TIMEOUT)
+    print(f"共{len(accounts)}个账号，使用{workers}个工作进程，每个账号最长{timeout}秒")
+
+    context = multiprocessing.get_context("spawn")
+    results_queue = context.Queue()
+    waiting = list(accounts)
+    running = {}
+    results = {}
+
+    def drain():
+        """取出队列中已有的所有结果；结果按完成顺序入队，不一定属于刚退出的那个进程"""
+        while True:
+            try:
+                result = results_queue.get_nowait()
+            except queue.Empty:
+                return
+            results[result["account"]] = result
+
+    def collect(block_seconds):
+        """最多等待block_seconds秒取出一个结果，然后取出队列中剩下的结果"""
+        try:
+            result = results_queue.get(timeout=block_seconds)
+        except queue.Empty:
+            return
+        results[result["account"]] = result
+        drain()
+
+    while waiting or running:
+        while waiting and len(running) < workers:
+            account = waiting.pop(0)
+            process = context.Process(target=shard_worker, args=(account, results_queue), name=f"keepalive-{account_key(account)}")
+            process.start()
+            running[account_key(account)] = (process, time.monotonic() + timeout, account)
+
+        collect(1)
+        for key, (process, deadline, account) in list(running.items()):
+            if key in results:
+                process.join()
+                del running[key]
+            elif not process.is_alive():
+                # 进程已退出，它的结果可能排在其他账号的结果之后还留在队列中，先取完队列再判断
+                drain()
+                if key not in results:
+                    collect(2)
+                if key not in results:
+                    print(f"账号{account.username}的工作进程异常退出（退出码{process.exitcode}）")
+                    results[key] = {"account": key, "status": "crashed", "pending": list(account.urls),
+                                    "observations": {}, "error": f"exitcode {process.exitcode}"}
+                del running[key]
+            elif time.monotonic() > deadline:
+                print(f"账号{account.username}超过{timeout}秒仍未完成，结束其工作进程")
+                kill_worker(process)
+                results[key] = {"account": key, "status": "timeout", "pending": list(account.urls),
+                                "observations": {}, "error": "timeout"}
+                del running[key]
+    # 最后一批进程同时结束时，其他账号的结果可能还留在队列中，用真实结果替换"crashed"记录
+    drain()
+    return results
+
+def record_results(accounts, results):
+    """在主进程中统一把各账号的观测结果写入调度状态
+
+    正常结束的账号只记录本次检查了的目标（未到检查时间的目标不在observations中），
+    出错、崩溃或超时的账号按所有目标失败记录
+    """
+    scheduler = AdaptiveScheduler()
+    for account in accounts:
+        result = results.get(account_key(account))
+        if not result:
+            continue
+        checked = result["status"] in ("ok", "failed")
+        urls = [url for url in account.urls if url and (url in result["observations"] or not checked)]
+        if urls:
+            record_observations(scheduler, urls, result["observations"], result["pending"])
+
+def write_metrics(results):
+    """在主进程中合并各工作进程的指标并写入KEEPALIVE_METRICS_FILE"""
+    for result in results.values():
+        metrics.merge(result.get("metrics") or {})
+    metrics.write_textfile()
+
+def report(accounts, results):
+    """打印合并的结果，返回是否所有账号的所有目标都在运行"""
+    print("多账号保活结果:")
+    all_ok = True
+    for account in accounts:
+        result = results.get(account_key(account), {"status": "missing", "pending": account.urls})
+        urls = [url for url in account.urls if url]
+        pending = [url for url in result["pending"] if url]
+        elapsed = f"，耗时{result['elapsed']:.1f}秒" if "elapsed" in result else ""
+        print(f"  {account.username}: {result['status']}，{len(urls) - len(pending)}/{len(urls)}个目标正在运行{elapsed}")
+        for url in pending:
+            print(f"    未运行: {url}")
+        if result.get("error"):
+            print(f"    错误: {result['error']}")
+        all_ok = all_ok and result["status"] == "ok"
+    print("脚本执行成功：所有账号的应用正在运行" if all_ok else "脚本执行失败：部分账号的应用未运行")
+    return all_ok
+
+if __name__ == "__main__":
+    # python sharding.py：按KEEPALIVE_ACCOUNTS_FILE或KEEPALIVE_ACCOUNTS中的账号多进程保活一次
+    # python sharding.py daemon：常驻模式，所有账号共用一个浏览器的上下文池
+    accounts = load_accounts()
+    if not accounts:
+        print("错误: 未配置多账号（KEEPALIVE_ACCOUNTS_FILE或KEEPALIVE_ACCOUNTS），单账号请直接运行main.py")
+        raise SystemExit(1)
+    if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+        with sync_playwright() as playwright:
+            run_daemon(playwright, accounts=accounts)
+    else:
+        results = run_sharded(accounts)
+        record_results(accounts, results)
+        write_metrics(results)
+        raise SystemExit(0 if report(accounts, results) else 1)
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import time
+import uuid
+import inspect
+import functools
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+
+# 每个阶段的耗时以JSON行的形式追加到该文件，KEEPALIVE_TRACE_FILE为空字符串时关闭记录
+TRACE_FILE_ENV = "KEEPALIVE_TRACE_FILE"
+DEFAULT_TRACE_FILE = "keepalive_spans.jsonl"
+# 记录文件超过该大小（字节）时改名为keepalive_spans.jsonl.1（覆盖上一份）并重新开始，0表示不限制
+TRACE_MAX_BYTES_ENV = "KEEPALIVE_TRACE_MAX_BYTES"
+DEFAULT_TRACE_MAX_BYTES = 5 * 1024 * 1024
+
+RUN_ID = uuid.uuid4().hex[:12]
+_current_span = contextvars.ContextVar("current_span", default=None)
+_listeners = []
+
+def add_span_listener(callback):
+    """注册在每个阶段结束时调用的回调，参数为写入文件的那条记录（例如metrics.py据此更新指标）"""
+    _listeners.append(callback)
+
+def trace_file():
+    path = os.environ.get(TRACE_FILE_ENV, DEFAULT_TRACE_FILE)
+    return Path(path) if path else None
+
+def trace_max_bytes():
+    try:
+        return int(os.environ.get(TRACE_MAX_BYTES_ENV, DEFAULT_TRACE_MAX_BYTES))
+    except ValueError:
+        return DEFAULT_TRACE_MAX_BYTES
+
+def rotate_trace_file(path):
+    """文件超过大小上限时轮转，只保留一份旧记录"""
+    max_bytes = trace_max_bytes()
+    if max_bytes <= 0:
+        return
+    try:
+        if path.stat().st_size >= max_bytes:
+            path.replace(path.with_name(path.name + ".1"))
+    except FileNotFoundError:
+        pass
+
+def write_span(record):
+    path = trace_file()
+    if path is None:
+        return
+    try:
+        rotate_trace_file(path)
+        with open(path, "a") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"写入耗时记录时出错: {str(e)}")
+
+def start_span(name, **attrs):
+    """开始记录一个阶段，返回的句柄交给end_span结束；嵌套调用时自动记录父阶段"""
+    span_id = uuid.uuid4().hex[:12]
+    record = {
+        "run": RUN_ID,
+        "span": span_id,
+        "parent": _current_span.get(),
+        "name": name,
+        "ts": time.time(),
+        "attrs": dict(attrs),
+        "status": "ok",
+    }
+    return record, _current_span.set(span_id), time.monotonic()
+
+def end_span(handle, error=None, **attrs):
+    """结束阶段并写入一行记录，attrs会合并到阶段属性中"""
+    record, token, started = handle
+    record["duration"] = round(time.monotonic() - started, 4)
+    record["attrs"].update(attrs)
+    if error is not None:
+        record["status"] = "error"
+        record["error"] = f"{type(error).__name__}: {error}"
+    _current_span.reset(token)
+    write_span(record)
+    for callback in _listeners:
+        try:
+            callback(record)
+        except Exception as e:
+            print(f"处理耗时记录时出错: {str(e)}")
+
+@contextmanager
+def span(name, **attrs):
+    """以with语句记录一个阶段的耗时，可以在阶段内往返回的字典里补充属性"""
+    handle = start_span(name, **attrs)
+    try:
+        yield handle[0]["attrs"]
+    except BaseException as e:
+        end_span(handle, error=e)
+        raise
+    end_span(handle)
+
+def traced(name):
+    """把整个函数（同步或async）作为一个阶段记录的装饰器"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name) as attributes:
+                    result = await func(*args, **kwargs)
+                    attributes["result"] = result if isinstance(result, (bool, int, str, type(None))) else None
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as attributes:
+                result = func(*args, **kwargs)
+                attributes["result"] = result if isinstance(result, (bool, int, str, type(None))) else None
+                return result
+        return wrapper
+    return decorator
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+def summarize(path):
+    """按阶段名统计多次运行的耗时：次数、错误数、p50、p95和最大值"""
+    durations = {}
+    errors = {}
+    runs = set()
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            runs.add(record.get("run"))
+            durations.setdefault(record["name"], []).append(record["duration"])
+            if record.get("status") == "error":
+                errors[record["name"]] = errors.get(record["name"], 0) + 1
+
+    print(f"共{len(runs)}次运行")
+    print(f"{'阶段':<32}{'次数':>6}{'错误':>6}{'p50':>9}{'p95':>9}{'max':>9}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<32}{len(values):>6}{errors.get(name, 0):>6}"
+              f"{percentile(values, 0.5):>9.2f}{percentile(values, 0.95):>9.2f}{max(values):>9.2f}")
+
+if __name__ == "__main__":
+    # python telemetry.py summary [文件]
+    if len(sys.argv) < 2 or sys.argv[1] != "summary":
+        print("用法: python telemetry.py summary [keepalive_spans.jsonl]")
+        raise SystemExit(1)
+    summarize(sys.argv[2] if len(sys.argv) > 2 else (trace_file() or DEFAULT_TRACE_FILE))
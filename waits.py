@@ -0,0 +1,61 @@
+import time
+import asyncio
+
+# 轮询间隔从INITIAL_INTERVAL开始，每次乘以BACKOFF_FACTOR，最长不超过MAX_INTERVAL（秒）
+INITIAL_INTERVAL = 0.25
+MAX_INTERVAL = 2.0
+BACKOFF_FACTOR = 2
+
+def poll_intervals(timeout, initial=INITIAL_INTERVAL, maximum=MAX_INTERVAL, factor=BACKOFF_FACTOR):
+    """生成递增的轮询间隔，总和不超过timeout秒"""
+    remaining = timeout
+    interval = initial
+    while remaining > 0:
+        step = min(interval, remaining)
+        yield step
+        remaining -= step
+        interval = min(interval * factor, maximum)
+
+def pause(seconds, page=None):
+    """同步API中等待seconds秒
+
+    同步API只有在调用Playwright方法时才会处理路由拦截和页面事件，time.sleep期间被拦截的请求会一直挂起，
+    因此有可用页面时用page.wait_for_timeout等待（同一连接上所有页面的事件都会被处理），页面已关闭时才用time.sleep
+    """
+    if page is not None:
+        try:
+            if not page.is_closed():
+                page.wait_for_timeout(seconds * 1000)
+                return
+        except Exception:
+            pass
+    time.sleep(seconds)
+
+def wait_until(condition, timeout, initial=INITIAL_INTERVAL, maximum=MAX_INTERVAL, page=None):
+    """以递增间隔轮询condition，条件满足时立即返回其结果，超过timeout秒返回最后一次结果
+
+    同步API中请传入page，等待期间继续处理路由拦截和页面事件（见pause）
+    """
+    started = time.monotonic()
+    result = condition()
+    if result:
+        return result
+    for step in poll_intervals(timeout, initial, maximum):
+        pause(step, page)
+        result = condition()
+        if result or time.monotonic() - started >= timeout:
+            return result
+    return result
+
+async def wait_until_async(condition, timeout, initial=INITIAL_INTERVAL, maximum=MAX_INTERVAL):
+    """wait_until的asyncio版本，condition为协程函数"""
+    started = time.monotonic()
+    result = await condition()
+    if result:
+        return result
+    for step in poll_intervals(timeout, initial, maximum):
+        await asyncio.sleep(step)
+        result = await condition()
+        if result or time.monotonic() - started >= timeout:
+            return result
+    return result